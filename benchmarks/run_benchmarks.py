@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the quote engine and chatbot state machine
+
+Runs entirely in-process (Flask test client, stub Gemini model), so no server,
+network or API key is needed. Lender and vehicle tables are scaled synthetically
+and results are written as JSON so two runs can be compared:
+
+    python -m benchmarks.run_benchmarks --output bench_results.json
+    python -m benchmarks.run_benchmarks --baseline bench_results.json --output new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+# Keep the chatbot importable and quiet without a real Gemini key, and never
+# point it at a live endpoint
+os.environ.setdefault('GEMINI_API_KEY', 'offline-benchmark')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.pop('GEMINI_API_ENDPOINT', None)
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import google.generativeai as genai  # noqa: E402
+
+from src import app as app_module, chatbot_service  # noqa: E402
+from src.chatbot_service import FinancialAdvisorChatbot  # noqa: E402
+from src.llm_gateway import LLMGateway  # noqa: E402
+from src.quote_engine import parse_rate_range  # noqa: E402
+
+DEFAULT_SCALES = [1, 10, 100, 1000]
+CREDIT_TIERS = {'excellent': 780, 'good': 700, 'fair': 620, 'poor': 540}
+
+CONVERSATION = ['85k', '720', 'own with mortgage', 'full time', '$5,000', 'buy', 'suv']
+
+STUB_RECOMMENDATIONS = json.dumps({
+    "recommendation": "Financing (Purchase) is recommended for your profile",
+    "reasoning": "Stub model response used for offline benchmarking.",
+    "financial_analysis": {},
+    "tips": [],
+    "suggested_terms": {},
+    "concerns": [],
+    "next_steps": [],
+    "toyota_advantages": []
+})
+
+VALIDATION_INPUTS = {
+    '_validate_income': ['85000', '$85,000', '85k', '50-60k', 'lots'],
+    '_validate_credit_score': ['720', '250', 'excellent'],
+    '_validate_housing_status': ['rent', 'I own with a mortgage', 'paid off, own it', 'boat'],
+    '_validate_employment_status': ['full-time', 'self employed', 'freelance', 'astronaut'],
+    '_validate_down_payment': ['5000', '$5,000', '5k', 'none'],
+    '_validate_loan_preference': ['financing', 'I want to buy', 'both', 'unsure'],
+    '_validate_vehicle_preference': ['suv', 'pickup truck', 'electric', 'spaceship'],
+}
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Stand-in for genai.GenerativeModel that answers instantly with fixed JSON."""
+
+    def generate_content(self, prompt, **kwargs):
+        return StubResponse(STUB_RECOMMENDATIONS)
+
+
+# Real model calls attempted during the run; the chatbot falls back to rules when
+# one fails, so they are counted here and the run fails instead of timing the fallback
+REAL_MODEL_CALLS = []
+
+def _refuse_real_call(*args, **kwargs):
+    REAL_MODEL_CALLS.append(args[1:2])
+    raise RuntimeError('benchmarks must not reach the Gemini API; a model tier was left unstubbed')
+
+genai.GenerativeModel.generate_content = _refuse_real_call
+genai.GenerativeModel.generate_content_async = _refuse_real_call
+chatbot_service.generate_content_rest = _refuse_real_call
+
+# Stubbed calls are timed as they are; the app gateway's rate limit would make the
+# conversation benchmark measure token-bucket sleeps instead
+BENCH_GATEWAY = LLMGateway.unbounded()
+
+def offline_chatbot(**kwargs):
+    """
+    A chatbot with every model tier (any GenerativeModel attribute) replaced by
+    StubModel, admitted by an unbounded gateway.
+    """
+    chatbot = FinancialAdvisorChatbot(gateway=BENCH_GATEWAY, **kwargs)
+    for name, value in vars(chatbot).items():
+        if isinstance(value, genai.GenerativeModel):
+            setattr(chatbot, name, StubModel())
+    return chatbot
+
+
+# --- Timing Helpers ---
+
+def measure(func, min_iterations=5, time_budget=0.5):
+    """Calls func repeatedly within a time budget and returns latency stats in microseconds."""
+    samples = []
+    deadline = time.perf_counter() + time_budget
+    while len(samples) < min_iterations or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1e6)
+        if len(samples) >= 100000:
+            break
+    samples.sort()
+    return {
+        'iterations': len(samples),
+        'min_us': round(samples[0], 3),
+        'median_us': round(statistics.median(samples), 3),
+        'mean_us': round(statistics.fmean(samples), 3),
+        'p95_us': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+    }
+
+
+# --- Synthetic Scaling ---
+
+def scale_lenders(lenders, factor):
+    """Replicates lender rows with unique names so every copy produces its own options."""
+    if factor == 1:
+        return list(lenders)
+    scaled = []
+    for copy_index in range(factor):
+        for lender in lenders:
+            row = dict(lender)
+            row['lender_id'] = f"{lender.get('lender_id', 'L')}_{copy_index}"
+            row['lender_name'] = f"{lender.get('lender_name', 'Lender')} #{copy_index}"
+            scaled.append(row)
+    return scaled
+
+def scale_vehicles(vehicles, factor):
+    """Replicates vehicles with small price offsets so the price index stays realistic."""
+    if factor == 1:
+        return list(vehicles)
+    scaled = []
+    for copy_index in range(factor):
+        for vehicle in vehicles:
+            row = dict(vehicle)
+            row['trim'] = f"{vehicle['trim']} #{copy_index}"
+            row['price'] = vehicle['price'] + copy_index * 10
+            scaled.append(row)
+    return scaled
+
+
+# --- Benchmarks ---
+
+def bench_parse_rate_range(results):
+    samples = ['1.99% - 4.99%', '13.49%', '', 'Varies', '12.00% - 22.00%']
+
+    def run():
+        for sample in samples:
+            parse_rate_range(sample)
+
+    results['parse_rate_range'] = measure(run)
+
+def bench_validators(results):
+    chatbot = FinancialAdvisorChatbot()
+    for method_name, inputs in VALIDATION_INPUTS.items():
+        method = getattr(chatbot, method_name)
+
+        def run(method=method, inputs=inputs):
+            for value in inputs:
+                method(value)
+
+        results[method_name] = measure(run)
+
+    def run_dispatch():
+        for question_key in chatbot.question_templates:
+            chatbot._validate_response('idk', question_key)
+
+    results['_validate_response'] = measure(run_dispatch)
+
+def bench_conversation(results):
+    def run():
+        # No vehicle picked, so all seven questions are asked
+        chatbot = offline_chatbot()
+        chatbot.start_conversation()
+        for answer in CONVERSATION:
+            response = chatbot.process_response(answer)
+        assert response['type'] == 'recommendations', response
+
+    results['conversation_seven_steps'] = measure(run)
+    assert not REAL_MODEL_CALLS, f"{len(REAL_MODEL_CALLS)} real Gemini call(s) attempted"
+
+def bench_endpoints(results, client, scale):
+    for tier, credit_score in CREDIT_TIERS.items():
+        payload = {'credit_score': credit_score, 'vehicle_price': 32000, 'down_payment': 3000}
+
+        def run(payload=payload):
+            response = client.post('/api/financing-options', json=payload)
+            assert response.status_code == 200
+
+        results[f'financing_options[{tier}]@{scale}x'] = measure(run)
+
+    def run_state():
+        response = client.post('/api/financing-options', json={
+            'credit_score': 700, 'vehicle_price': 32000, 'down_payment': 3000, 'state': 'FL'
+        })
+        assert response.status_code == 200
+
+    results[f'financing_options[good,FL]@{scale}x'] = measure(run_state)
+
+    def run_payment():
+        response = client.post('/api/calculate-payment', json={
+            'vehicle_price': 32000, 'down_payment': 3000, 'loan_term': 60, 'interest_rate': 6.5
+        })
+        assert response.status_code == 200
+
+    results[f'calculate_payment@{scale}x'] = measure(run_payment)
+
+    def run_affordability():
+        response = client.post('/api/affordability', json={
+            'monthly_budget': 650, 'credit_score': 700, 'down_payment': 3000, 'limit': 10
+        })
+        assert response.status_code == 200
+
+    results[f'affordability@{scale}x'] = measure(run_affordability)
+
+
+def run_suite(scales):
+    base_vehicles = list(app_module.TOYOTA_VEHICLES)
+    base_lenders = list(app_module.financing_lenders())
+    client = app_module.app.test_client()
+    results = {}
+
+    bench_parse_rate_range(results)
+    bench_validators(results)
+    bench_conversation(results)
+
+    try:
+        for scale in scales:
+            app_module.replace_data(vehicles=scale_vehicles(base_vehicles, scale),
+                                    lenders=scale_lenders(base_lenders, scale))
+            bench_endpoints(results, client, scale)
+    finally:
+        app_module.replace_data(vehicles=base_vehicles, lenders=base_lenders)
+
+    return results
+
+
+# --- Reporting ---
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_to_baseline(results, baseline, threshold):
+    """Returns (name, baseline_us, current_us, ratio) for benchmarks slower than the threshold."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        ratio = current['median_us'] / previous['median_us'] if previous['median_us'] else 1.0
+        if ratio > 1 + threshold:
+            regressions.append((name, previous['median_us'], current['median_us'], ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', default=','.join(str(s) for s in DEFAULT_SCALES),
+                        help='comma-separated dataset multipliers (default: %(default)s)')
+    parser.add_argument('--output', default='bench_results.json', help='where to write JSON results')
+    parser.add_argument('--baseline', help='previous results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed median slowdown vs baseline before failing (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    scales = [int(s) for s in args.scales.split(',') if s.strip()]
+    results = run_suite(scales)
+
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scales': scales,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    width = max(len(name) for name in results)
+    for name, stats in results.items():
+        print(f"{name:<{width}}  median {stats['median_us']:>12.1f} us  p95 {stats['p95_us']:>12.1f} us  n={stats['iterations']}")
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}:")
+            for name, before, after, ratio in regressions:
+                print(f"  {name}: {before:.1f} us -> {after:.1f} us ({ratio:.2f}x)")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
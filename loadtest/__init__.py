@@ -0,0 +1,3 @@
+"""
+Load-testing tools: a fake Gemini server and a concurrent traffic generator
+"""
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Gemini generateContent REST API
+
+Answers every POST .../models/<model>:generateContent with a canned
+recommendations document after a configurable delay, and can inject HTTP
+errors or non-JSON model output. Point the app at it with:
+
+    GEMINI_API_KEY=fake GEMINI_API_ENDPOINT=http://127.0.0.1:8089 python run.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RECOMMENDATIONS = {
+    "recommendation": "Financing (Purchase) is recommended for your profile",
+    "reasoning": "Canned response from the local fake Gemini server.",
+    "financial_analysis": {
+        "debt_to_income_ratio": "12%",
+        "affordable_monthly_payment": "$900",
+        "credit_tier": "good",
+        "risk_level": "low"
+    },
+    "tips": ["Compare Toyota Financial Services rates with other lenders"],
+    "suggested_terms": {
+        "loan_term": "60 months",
+        "down_payment": "10%",
+        "financing_type": "financing",
+        "interest_rate_range": "4.99% - 7.50%"
+    },
+    "concerns": [],
+    "next_steps": ["Get pre-qualified"],
+    "toyota_advantages": ["Promotional rates"]
+}
+
+
+class FakeGeminiConfig:
+    def __init__(self, latency_ms=800.0, jitter_ms=200.0, error_rate=0.0, invalid_json_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.invalid_json_rate = invalid_json_rate
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def make_handler(config: FakeGeminiConfig):
+    class FakeGeminiHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass  # Keep the console quiet under load
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0) or 0))
+            with config.lock:
+                config.requests += 1
+
+            if ':generateContent' not in self.path:
+                self._send_json(404, {'error': {'code': 404, 'message': f'Unknown path {self.path}'}})
+                return
+
+            delay = max(0.0, random.gauss(config.latency_ms, config.jitter_ms)) / 1000
+            time.sleep(delay)
+
+            if random.random() < config.error_rate:
+                self._send_json(503, {'error': {'code': 503, 'message': 'Injected failure', 'status': 'UNAVAILABLE'}})
+                return
+
+            text = json.dumps(RECOMMENDATIONS)
+            if random.random() < config.invalid_json_rate:
+                text = "Here are my recommendations: " + text  # Forces the app's JSON fallback path
+
+            self._send_json(200, {
+                'candidates': [{
+                    'content': {'parts': [{'text': text}], 'role': 'model'},
+                    'finishReason': 'STOP',
+                    'index': 0
+                }],
+                'usageMetadata': {'promptTokenCount': 900, 'candidatesTokenCount': 300, 'totalTokenCount': 1200}
+            })
+
+    return FakeGeminiHandler
+
+
+def start_server(host='127.0.0.1', port=8089, config=None):
+    """Starts the fake server on a daemon thread and returns (server, config)."""
+    config = config or FakeGeminiConfig()
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, config
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local fake Gemini generateContent server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=800.0, help='mean response delay (default: %(default)s)')
+    parser.add_argument('--jitter-ms', type=float, default=200.0, help='delay standard deviation (default: %(default)s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of 503 responses (default: %(default)s)')
+    parser.add_argument('--invalid-json-rate', type=float, default=0.0,
+                        help='fraction of responses whose text is not valid JSON (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    config = FakeGeminiConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.invalid_json_rate)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    server.daemon_threads = True
+    print(f"Fake Gemini listening on http://{args.host}:{args.port} "
+          f"(latency {args.latency_ms}±{args.jitter_ms} ms, errors {args.error_rate:.0%}, "
+          f"invalid JSON {args.invalid_json_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Served {config.requests} requests")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Concurrent load generator for the Toyota Financial Services app
+
+Each simulated customer walks the chatbot flow
+(/api/chatbot/start -> /api/chatbot/respond per question -> /api/chatbot/summary) with
+its own cookie session, mixed with /api/financing-options and
+/api/calculate-payment traffic. Reports throughput and p50/p95/p99 latency
+per endpoint.
+
+    python -m loadtest.fake_gemini --latency-ms 800 --error-rate 0.02 &
+    GEMINI_API_KEY=fake GEMINI_API_ENDPOINT=http://127.0.0.1:8089 python run.py &
+    python -m loadtest.run_load --base-url http://localhost:5002 --customers 2000 --concurrency 500
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ANSWERS = {
+    'income': ['45000', '65k', '$85,000', '120000'],
+    'credit_score': ['590', '640', '700', '780'],
+    'housing_status': ['rent', 'own', 'own_outright', 'other'],
+    'employment_status': ['full-time', 'part-time', 'self-employed', 'retired'],
+    'down_payment': ['0', '2500', '5k', '$10,000'],
+    'loan_preference': ['financing', 'lease', 'either'],
+    'vehicle_preference': ['sedan', 'suv', 'hybrid', 'truck', 'any'],
+}
+QUESTION_ORDER = ['income', 'credit_score', 'housing_status', 'employment_status',
+                  'down_payment', 'loan_preference', 'vehicle_preference']
+VEHICLE_PRICES = [24800, 29000, 33800, 39000, 44000, 52000]
+
+
+class LatencyRecorder:
+    """Collects per-endpoint latencies and error counts from many worker threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, endpoint, seconds, ok):
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, elapsed):
+        report = {}
+        with self.lock:
+            for endpoint, samples in sorted(self.samples.items()):
+                ordered = sorted(samples)
+                report[endpoint] = {
+                    'requests': len(ordered),
+                    'errors': self.errors.get(endpoint, 0),
+                    'throughput_rps': round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+                    'p50_ms': round(percentile(ordered, 50) * 1000, 2),
+                    'p95_ms': round(percentile(ordered, 95) * 1000, 2),
+                    'p99_ms': round(percentile(ordered, 99) * 1000, 2),
+                    'max_ms': round(ordered[-1] * 1000, 2),
+                }
+        return report
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def timed(recorder, endpoint, http, method, url, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = http.request(method, url, **kwargs)
+        ok = response.status_code < 400
+    except requests.RequestException:
+        response, ok = None, False
+    recorder.record(endpoint, time.perf_counter() - start, ok)
+    return response
+
+
+def simulate_customer(base_url, recorder, quote_requests, timeout, rng):
+    """One customer: a full chatbot conversation interleaved with quote traffic."""
+    http = requests.Session()
+    vehicle_price = rng.choice(VEHICLE_PRICES)
+    credit_score = int(rng.choice(ANSWERS['credit_score']))
+
+    def quote_traffic():
+        for _ in range(quote_requests):
+            if rng.random() < 0.5:
+                timed(recorder, 'POST /api/financing-options', http, 'POST', f"{base_url}/api/financing-options",
+                      json={'credit_score': credit_score, 'vehicle_price': vehicle_price,
+                            'down_payment': vehicle_price * 0.1}, timeout=timeout)
+            else:
+                timed(recorder, 'POST /api/calculate-payment', http, 'POST', f"{base_url}/api/calculate-payment",
+                      json={'vehicle_price': vehicle_price, 'down_payment': vehicle_price * 0.1,
+                            'loan_term': rng.choice([36, 48, 60, 72]), 'interest_rate': rng.uniform(2, 12)},
+                      timeout=timeout)
+
+    response = timed(recorder, 'POST /api/chatbot/start', http, 'POST', f"{base_url}/api/chatbot/start",
+                     json={'vehicle_price': str(vehicle_price), 'vehicle_name': 'Toyota'}, timeout=timeout)
+    if response is None or response.status_code >= 400:
+        return
+
+    quote_traffic()
+    for question_key in QUESTION_ORDER:
+        response = timed(recorder, 'POST /api/chatbot/respond', http, 'POST', f"{base_url}/api/chatbot/respond",
+                         json={'response': rng.choice(ANSWERS[question_key])}, timeout=timeout)
+        # The session may ask fewer questions than QUESTION_ORDER lists; stop once recommendations arrive
+        if response is None or response.status_code >= 400 or response.json().get('completed'):
+            break
+
+    timed(recorder, 'GET /api/chatbot/summary', http, 'GET', f"{base_url}/api/chatbot/summary", timeout=timeout)
+    quote_traffic()
+
+
+def run_load(base_url, customers, concurrency, quote_requests=2, timeout=60.0, ramp_up=0.0, seed=None):
+    """Runs the simulation and returns (elapsed_seconds, per-endpoint report)."""
+    recorder = LatencyRecorder()
+    seed_source = random.Random(seed)
+    delay = ramp_up / customers if customers and ramp_up else 0.0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i in range(customers):
+            pool.submit(simulate_customer, base_url, recorder, quote_requests, timeout,
+                        random.Random(seed_source.random()))
+            if delay:
+                time.sleep(delay)
+    elapsed = time.perf_counter() - start
+    return elapsed, recorder.summary(elapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Concurrent load test for the chatbot and quote APIs')
+    parser.add_argument('--base-url', default='http://localhost:5002')
+    parser.add_argument('--customers', type=int, default=1000, help='simulated customers (default: %(default)s)')
+    parser.add_argument('--concurrency', type=int, default=200, help='concurrent customers (default: %(default)s)')
+    parser.add_argument('--quote-requests', type=int, default=2,
+                        help='quote calls before and after each conversation (default: %(default)s)')
+    parser.add_argument('--timeout', type=float, default=60.0, help='per-request timeout in seconds')
+    parser.add_argument('--ramp-up', type=float, default=0.0, help='seconds over which to start customers')
+    parser.add_argument('--seed', type=int, help='random seed for repeatable answer mixes')
+    parser.add_argument('--output', help='also write the report as JSON to this file')
+    args = parser.parse_args(argv)
+
+    elapsed, report = run_load(args.base_url, args.customers, args.concurrency,
+                               args.quote_requests, args.timeout, args.ramp_up, args.seed)
+
+    total_requests = sum(stats['requests'] for stats in report.values())
+    print(f"{args.customers} customers, concurrency {args.concurrency}: "
+          f"{total_requests} requests in {elapsed:.1f}s ({total_requests / elapsed:.1f} req/s)\n")
+    print(f"{'endpoint':<32} {'reqs':>7} {'errs':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, stats in report.items():
+        print(f"{endpoint:<32} {stats['requests']:>7} {stats['errors']:>6} {stats['throughput_rps']:>8.1f} "
+              f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'customers': args.customers, 'concurrency': args.concurrency,
+                       'elapsed_seconds': round(elapsed, 3), 'endpoints': report}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,97 +1,127 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, g, send_file
+from flask import before_render_template, template_rendered
 from flask_cors import CORS
 import os
 import json
-import csv
+import base64
+import time
+import uuid
+import hmac
+import math
 from dotenv import load_dotenv
-from .chatbot_service import FinancialAdvisorChatbot
+from . import chatbot_service, metrics
+from .chatbot_service import FinancialAdvisorChatbot, warm_up_client
+from .data_loading import iter_financing_data, iter_vehicles_from_csv, load_financing_data, load_vehicles_from_csv
+from .json_provider import FastJSONProvider
+from .payload_store import PAYLOAD_MAX_BYTES, PayloadStore, SaveRateLimiter
+from .profiling import ProfileStore, RequestProfiler
+from .memory_diagnostics import DIAGNOSTICS
+from .sqlite_store import SQLiteStore
+from .tco_engine import HORIZON_MONTHS, OPTION_TYPES, TCOTable
+from .logging_service import configure_logging, get_logger
+from .quote_engine import (
+    RATE_COLUMNS,
+    US_STATES,
+    BestOfferTable,
+    PaymentBadgeView,
+    LenderIndex,
+    VehiclePriceIndex,
+    annuity_payment,
+    build_financing_options,
+    compare_options,
+    get_rate_column_name,
+    option_rank_key,
+    parse_rate_range,
+    select_options,
+    solve_affordability,
+    tier_name,
+)
 
 # Load environment variables from .env file
 load_dotenv()
 
+configure_logging()
+logger = get_logger(__name__)
+
 # --- File Paths ---
 VEHICLES_CSV_FILE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'toyotacars.csv')
 FINANCE_CSV_FILE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'financeandlease.csv')
+SQLITE_DB_PATH = os.environ.get('SQLITE_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'data', 'toyota.db'))
 
+# 'memory' keeps both tables in lists; 'sqlite' queries them from SQLITE_DB_PATH
+DATA_BACKEND = os.environ.get('DATA_BACKEND', 'memory')
+# Vehicles rendered on the home page and ranked by /api/tco when the catalog lives in SQLite;
+# the other vehicle and lender queries go to the database
+CATALOG_LIMIT = int(os.environ.get('CATALOG_LIMIT', 500))
 
-# --- Data Loading and Parsing Helpers ---
 
-def parse_rate_range(rate_string):
+# Global data variables
+if DATA_BACKEND == 'sqlite':
+    DATA_STORE = SQLiteStore(SQLITE_DB_PATH)
+    if DATA_STORE.needs_import():
+        counts = DATA_STORE.import_data(iter_vehicles_from_csv(VEHICLES_CSV_FILE_PATH),
+                                        iter_financing_data(FINANCE_CSV_FILE_PATH))
+        logger.info("sqlite store imported", path=SQLITE_DB_PATH, **counts)
+    TOYOTA_VEHICLES = DATA_STORE.catalog(CATALOG_LIMIT)
+    # Raw lender rows stay in the database; financing_lenders() reads them when a tool needs them
+    FINANCING_LENDERS = None
+    VEHICLE_PRICE_INDEX = DATA_STORE.vehicle_index()
+    LENDER_INDEX = DATA_STORE.lender_index()
+else:
+    DATA_STORE = None
+    TOYOTA_VEHICLES = load_vehicles_from_csv(VEHICLES_CSV_FILE_PATH)
+    FINANCING_LENDERS = load_financing_data(FINANCE_CSV_FILE_PATH)
+    VEHICLE_PRICE_INDEX = VehiclePriceIndex(TOYOTA_VEHICLES)
+    LENDER_INDEX = LenderIndex(FINANCING_LENDERS)
+BEST_OFFERS = BestOfferTable(LENDER_INDEX)
+PAYMENT_BADGES = PaymentBadgeView(TOYOTA_VEHICLES, BEST_OFFERS)
+# Nationwide total cost arrays under None; a customer state's are built on its first request
+TCO_TABLES = {None: TCOTable(TOYOTA_VEHICLES, LENDER_INDEX)}
+
+def financing_lenders():
+    """The lender rows as loaded from the CSV, read from the database under the sqlite backend."""
+    return FINANCING_LENDERS if FINANCING_LENDERS is not None else DATA_STORE.lenders()
+
+def replace_data(vehicles=None, lenders=None):
     """
-    Parses a rate string (e.g., '1.99% - 4.99%') and returns a dict with min/max rates.
-    Defaults to 99.0 for max rate if parsing fails.
+    Swaps the in-memory vehicle and/or lender tables and rebuilds everything derived
+    from them. Used by data reloads and by the benchmark suite to scale the datasets.
+    Replaced tables are served from memory even under the sqlite backend.
     """
-    default_rate = 99.0
-    if not rate_string:
-        return {'min': default_rate, 'max': default_rate}
-    
-    try:
-        # Remove percentage signs and trim whitespace
-        rate_string = rate_string.replace('%', '').strip()
-        
-        if ' - ' in rate_string:
-            parts = [float(p.strip()) for p in rate_string.split(' - ') if p.strip()]
-            min_rate = parts[0] if parts else default_rate
-            max_rate = parts[-1] if len(parts) > 1 else min_rate
-        else:
-            # Handle single rate value (e.g., '13.49%')
-            min_rate = float(rate_string)
-            max_rate = min_rate
-            
-        return {'min': min_rate, 'max': max_rate}
-    except ValueError:
-        return {'min': default_rate, 'max': default_rate}
-
-def load_vehicles_from_csv(file_path):
-    """Loads vehicle data from the main CSV file."""
-    vehicles = []
-    try:
-        with open(file_path, mode='r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                try:
-                    price = int(row.get('msrp_approx', 0))
-                    year = int(row.get('year', 0))
-                except ValueError:
-                    price = 0
-                    year = 0
-
-                if price > 0 and year > 0:
-                    vehicle = {
-                        "year": year,
-                        "make": row.get('make', 'Toyota'),
-                        "model": row.get('model', 'Unknown'),
-                        "trim": row.get('trim', 'Base'),
-                        "price": price,
-                        "body_type": row.get('body_type'),
-                        "mpg_estimate": row.get('mpg_estimate')
-                    }
-                    vehicles.append(vehicle)
-    except FileNotFoundError:
-        print(f"ERROR: Vehicle CSV file not found at {file_path}")
-    return vehicles
-
-def load_financing_data(file_path):
-    """Loads financing and lease options from the dedicated CSV file."""
-    lenders = []
-    try:
-        with open(file_path, mode='r', newline='', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                lenders.append(row)
-    except FileNotFoundError:
-        print(f"ERROR: Finance CSV file not found at {file_path}")
-    return lenders
-
-# Global data variables
-TOYOTA_VEHICLES = load_vehicles_from_csv(VEHICLES_CSV_FILE_PATH)
-FINANCING_LENDERS = load_financing_data(FINANCE_CSV_FILE_PATH)
+    global TOYOTA_VEHICLES, FINANCING_LENDERS, VEHICLE_PRICE_INDEX, LENDER_INDEX, BEST_OFFERS, TCO_TABLES
+    if lenders is not None:
+        FINANCING_LENDERS = lenders
+        LENDER_INDEX = LenderIndex(lenders)
+        BEST_OFFERS = BestOfferTable(LENDER_INDEX)
+        PAYMENT_BADGES.refresh_lenders(BEST_OFFERS)
+    if vehicles is not None:
+        TOYOTA_VEHICLES = vehicles
+        VEHICLE_PRICE_INDEX = VehiclePriceIndex(vehicles)
+        PAYMENT_BADGES.refresh_vehicles(vehicles)
+    # Vectorized over the whole catalog, so a full rebuild is cheap
+    TCO_TABLES = {None: TCOTable(TOYOTA_VEHICLES, LENDER_INDEX)}
+
+# Largest page returned by /api/financing-options when pagination is requested
+MAX_OPTIONS_PAGE_SIZE = 100
+# Most options /api/compare aligns in one request
+MAX_COMPARE_OPTIONS = 5
+# Most rows (object types, allocation sites) an /admin/memory report lists
+MAX_MEMORY_REPORT_ROWS = 500
+# Deepest traceback tracemalloc may record per allocation; each frame costs memory on every allocation
+MAX_TRACEMALLOC_FRAMES = 64
+
+# Chatbot results and user data the financing, compare and payment pages share by token
+PAYLOADS = PayloadStore()
+PAYLOAD_SAVES = SaveRateLimiter()
+metrics.gauge('payload_store_entries', 'Page payloads currently held by the payload store.', lambda: len(PAYLOADS))
+metrics.REGISTRY.describe('payload_saves_rejected_total', 'counter', 'Page payload saves refused, by reason (rate_limited, too_large).')
+metrics.gauge('payload_store_bytes', 'JSON bytes of the page payloads held by the payload store.', lambda: PAYLOADS.size)
 
 # Initialize chatbot service
 try:
     CHATBOT = FinancialAdvisorChatbot()
 except ValueError as e:
-    print(f"Warning: Chatbot not initialized - {e}")
+    logger.warning("chatbot not initialized", reason=str(e))
     CHATBOT = None
 
 # --- Flask App Configuration ---
@@ -99,73 +129,297 @@ except ValueError as e:
 app = Flask(__name__,
             template_folder='templates',
             static_folder='static')
+app.json = FastJSONProvider(app)
 app.secret_key = 'toyota-financial-secret-key-2024'
 app.config['TEMPLATES_AUTO_RELOAD'] = True
 app.config['SESSION_COOKIE_SECURE'] = False  # Set to True in production with HTTPS
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['PERMANENT_SESSION_LIFETIME'] = 1800  # 30 minutes
-CORS(app)
+CORS(app, expose_headers=['X-Total-Count', 'X-Next-Cursor'])
+
+# --- Admin Access ---
+
+def admin_authorized():
+    """True when the request carries ADMIN_TOKEN in X-Admin-Token; admin features are off without one."""
+    token = os.environ.get('ADMIN_TOKEN')
+    return bool(token) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+
+# --- Request Metrics ---
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - start,
+                        endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+def _start_template_timer(sender, template, context, **extra):
+    g.setdefault('template_starts', []).append(time.perf_counter())
+
+def _record_template_render(sender, template, context, **extra):
+    starts = g.get('template_starts')
+    if starts:
+        metrics.observe('template_render_seconds', time.perf_counter() - starts.pop(),
+                        template=template.name or 'string')
+
+before_render_template.connect(_start_template_timer, app)
+template_rendered.connect(_record_template_render, app)
+
+# --- Request Profiling ---
+
+PROFILER = RequestProfiler(ProfileStore(), token=os.environ.get('ADMIN_TOKEN'))
+
+@app.before_request
+def start_request_profile():
+    if PROFILER.enabled and PROFILER.should_profile(request.headers.get('X-Profile') == '1' and admin_authorized()):
+        g.profiler = PROFILER.start()
+
+@app.after_request
+def finish_request_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        start = g.get('request_start')
+        profile_id = PROFILER.finish(profiler, {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.url_rule.rule if request.url_rule else 'unmatched',
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - start) * 1000, 2) if start is not None else None,
+            'created': time.time(),
+        })
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+# --- Memory Diagnostics ---
+
+DIAGNOSTICS.register('TOYOTA_VEHICLES', lambda: TOYOTA_VEHICLES)
+DIAGNOSTICS.register('FINANCING_LENDERS', lambda: FINANCING_LENDERS)
+DIAGNOSTICS.register('VEHICLE_PRICE_INDEX', lambda: VEHICLE_PRICE_INDEX)
+DIAGNOSTICS.register('LENDER_INDEX', lambda: LENDER_INDEX)
+DIAGNOSTICS.register('BEST_OFFERS', lambda: BEST_OFFERS)
+DIAGNOSTICS.register('PAYMENT_BADGES', lambda: PAYMENT_BADGES)
+DIAGNOSTICS.register('TCO_TABLES', lambda: TCO_TABLES)
+DIAGNOSTICS.register('PAYLOADS', lambda: PAYLOADS)
+DIAGNOSTICS.register('metrics_registry', lambda: metrics.REGISTRY)
+# Conversation state lives in the session cookie; in-flight recommendations are the only server-side copy
+DIAGNOSTICS.register('recommendation_flights', lambda: (chatbot_service._RECOMMENDATION_FLIGHTS,
+                                                        chatbot_service._ASYNC_RECOMMENDATION_FLIGHTS))
+
+@app.route('/admin/memory')
+def memory_report():
+    """RSS, tracemalloc status, structure sizes and object counts by type"""
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        objects = _bounded_int(request.args, 'objects', 25, MAX_MEMORY_REPORT_ROWS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(DIAGNOSTICS.report(objects))
+
+@app.route('/admin/memory/tracemalloc', methods=['POST'])
+def memory_tracing():
+    """Starts or stops tracemalloc: {"action": "start", "frames": 1} or {"action": "stop"}"""
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    data = request.json or {}
+    if data.get('action') == 'start':
+        try:
+            frames = _bounded_int(data, 'frames', 1, MAX_TRACEMALLOC_FRAMES, lower=1)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        DIAGNOSTICS.start_tracing(frames)
+    elif data.get('action') == 'stop':
+        DIAGNOSTICS.stop_tracing()
+    else:
+        return jsonify({'error': "action must be 'start' or 'stop'"}), 400
+    return jsonify(DIAGNOSTICS.report(0)['tracemalloc'])
+
+@app.route('/admin/memory/snapshots', methods=['POST'])
+def memory_snapshot():
+    """Takes a tracemalloc snapshot to diff against later"""
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        return jsonify(DIAGNOSTICS.take_snapshot(_bounded_int(request.args, 'limit', 20, MAX_MEMORY_REPORT_ROWS)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/admin/memory/diff')
+def memory_diff():
+    """Allocation growth from snapshot ?base= to ?target= (a fresh snapshot if omitted)"""
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        return jsonify(DIAGNOSTICS.diff(request.args.get('base', ''), request.args.get('target'),
+                                        request.args.get('group_by', 'lineno'),
+                                        _bounded_int(request.args, 'limit', 20, MAX_MEMORY_REPORT_ROWS)))
+    except KeyError as e:
+        return jsonify({'error': f'Unknown snapshot {e}'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/admin/profiles')
+def list_profiles():
+    """Stored request profiles, newest first"""
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify(PROFILER.store.list())
+
+@app.route('/admin/profiles/<profile_id>')
+def download_profile(profile_id):
+    """One profile as a pstats file, or as a text report with ?format=text"""
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    if request.args.get('format') == 'text':
+        summary = PROFILER.store.summary(profile_id)
+        if summary is None:
+            return jsonify({'error': 'Profile not found'}), 404
+        return Response(summary, mimetype='text/plain')
+    path = PROFILER.store.path(profile_id)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=f"{profile_id}.prof")
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus-style metrics scrape endpoint"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+# --- Health Checks ---
+
+# Filled in by warm_up(); readiness waits for it when WARMUP_ON_START is on
+WARMUP = {'enabled': os.environ.get('WARMUP_ON_START', '1') == '1', 'completed': False, 'seconds': None,
+          'llm_client': False}
+
+def warm_up():
+    """
+    Primes the best-offer table for every credit tier and state, compiles the
+    page templates and creates the Gemini client, so the first requests don't
+    pay for any of it.
+    """
+    start = time.perf_counter()
+    for rate_column in RATE_COLUMNS:
+        for state in (None, *US_STATES):
+            BEST_OFFERS.best_products(rate_column, state)
+    for template_name in app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html')):
+        app.jinja_env.get_template(template_name)
+    WARMUP['llm_client'] = warm_up_client() if CHATBOT else False
+    WARMUP['completed'] = True
+    WARMUP['seconds'] = round(time.perf_counter() - start, 3)
+    logger.info("warm-up complete", seconds=WARMUP['seconds'], llm_client=WARMUP['llm_client'])
+
+def llm_client_ready():
+    """
+    Whether the Gemini client was created. Retried on each probe while it isn't,
+    so a failure at start-up (or no warm-up at all) doesn't keep the app unready.
+    """
+    if not WARMUP['llm_client'] and CHATBOT is not None and (WARMUP['completed'] or not WARMUP['enabled']):
+        WARMUP['llm_client'] = warm_up_client()
+    return WARMUP['llm_client']
+
+@app.route('/healthz')
+def healthz():
+    """Liveness probe: constant time, touches no data"""
+    return Response('ok', mimetype='text/plain')
+
+@app.route('/readyz')
+def readyz():
+    """Readiness probe: data loaded, caches warm and (when configured) the Gemini client ready"""
+    checks = {
+        'data_loaded': bool(TOYOTA_VEHICLES) and bool(LENDER_INDEX.lender_count),
+        'caches_warm': WARMUP['completed'],
+        'llm_client': llm_client_ready(),
+    }
+    required = ['data_loaded']
+    if WARMUP['enabled']:
+        required.append('caches_warm')
+    if os.getenv('GEMINI_API_KEY'):
+        required.append('llm_client')
+    ready = all(checks[name] for name in required)
+    return jsonify({
+        'status': 'ready' if ready else 'not_ready',
+        'checks': checks,
+        'required': required,
+        'vehicles': len(TOYOTA_VEHICLES),
+        'lenders': LENDER_INDEX.lender_count,
+        'warmup_seconds': WARMUP['seconds'],
+    }), 200 if ready else 503
 
 # --- Routes ---
 
 @app.route('/')
 def home():
-    return render_template('home.html', vehicles=TOYOTA_VEHICLES)
+    vehicles = TOYOTA_VEHICLES
+    return render_template('home.html', vehicles=vehicles, payment_badges=PAYMENT_BADGES.badges(vehicles))
 
 @app.route('/preferences')
 def preferences():
     return render_template('preferences.html')
 
+def page_payload(param: str):
+    """
+    The data a page was opened with: the stored payload for ?token=, or the
+    legacy URL-encoded JSON in the given query parameter (old links and the
+    client fallback when the payload store can't be reached).
+    """
+    token = request.args.get('token')
+    if token:
+        payload = PAYLOADS.get(token)
+        if payload is None:
+            logger.info("payload token not found", route=request.endpoint)
+        return payload
+    raw = request.args.get(param)
+    if not raw:
+        return None
+    try:
+        return app.json.loads(raw)
+    except json.JSONDecodeError:
+        logger.warning("invalid payload param", route=request.endpoint, param=param, length=len(raw))
+        return None
+
 @app.route('/financing')
 def financing():
-    # Get chatbot responses from URL parameters or session
-    chatbot_responses = request.args.get('responses')
+    # Chatbot responses saved by the chatbot page
+    chatbot_data = page_payload('responses')
     vehicle_info = request.args.get('vehicle_info')
-    
-    # Parse chatbot responses if available
-    chatbot_data = None
-    if chatbot_responses:
-        try:
-            chatbot_data = json.loads(chatbot_responses)
-        except json.JSONDecodeError:
-            print(f"Error parsing chatbot responses: {chatbot_responses}")
-            chatbot_data = None
-    
-    return render_template('financing.html', 
-                         chatbot_responses=chatbot_responses,
-                         chatbot_data=chatbot_data,
-                         vehicle_info=vehicle_info)
+    return render_template('financing.html', chatbot_data=chatbot_data, vehicle_info=vehicle_info)
 
 @app.route('/compare')
 def compare():
-    # Get user data from URL parameters
-    user_data_param = request.args.get('userData')
-    user_data = None
-    if user_data_param:
-        try:
-            user_data = json.loads(user_data_param)
-        except json.JSONDecodeError:
-            print(f"Error parsing user data: {user_data_param}")
-            user_data = None
-    
-    return render_template('compare.html', user_data=user_data)
+    return render_template('compare.html', user_data=page_payload('userData'))
 
 @app.route('/payment')
 def payment():
-    # Get user data from URL parameters
-    user_data_param = request.args.get('userData')
-    print(f"Payment route - userData param: {user_data_param}")
-    user_data = None
-    if user_data_param:
-        try:
-            user_data = json.loads(user_data_param)
-            print(f"Payment route - parsed user_data: {user_data}")
-        except json.JSONDecodeError as e:
-            print(f"Error parsing user data: {user_data_param}, error: {e}")
-            user_data = None
-    
-    return render_template('payment.html', user_data=user_data)
+    return render_template('payment.html', user_data=page_payload('userData'))
+
+@app.route('/api/payloads', methods=['POST'])
+def save_payload():
+    """Save a page payload server-side once; pages then navigate with the returned short token"""
+    wait = PAYLOAD_SAVES.try_acquire(request.remote_addr or '')
+    if wait:
+        metrics.inc('payload_saves_rejected_total', reason='rate_limited')
+        response = jsonify({'error': 'Too many payloads saved, try again shortly'})
+        response.headers['Retry-After'] = str(math.ceil(wait))
+        return response, 429
+    # Read at most one byte past the limit, so a missing or false Content-Length can't grow the body
+    raw = request.stream.read(PAYLOAD_MAX_BYTES + 1)
+    if len(raw) > PAYLOAD_MAX_BYTES:
+        metrics.inc('payload_saves_rejected_total', reason='too_large')
+        return jsonify({'error': f'Payload exceeds {PAYLOAD_MAX_BYTES} bytes'}), 413
+    try:
+        payload = app.json.loads(raw)
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        return jsonify({'error': 'Payload must be a JSON object'}), 400
+    return jsonify({'token': PAYLOADS.put(payload, len(raw)), 'expires_in': int(PAYLOADS.ttl)}), 201
 
 @app.route('/chatbot')
 def chatbot():
@@ -177,6 +431,15 @@ def chatbot():
                          vehicle_price=vehicle_price, 
                          vehicle_name=vehicle_name)
 
+def restore_chatbot(chatbot_data):
+    """Rebuild a chatbot from the conversation stored in the session"""
+    chatbot_instance = FinancialAdvisorChatbot(
+        vehicle_price=chatbot_data['vehicle_price'],
+        vehicle_name=chatbot_data['vehicle_name']
+    )
+    chatbot_instance.conversation_state = chatbot_data['conversation_state'].copy()
+    return chatbot_instance
+
 @app.route('/api/chatbot/start', methods=['POST'])
 def chatbot_start():
     """Start a new chatbot conversation"""
@@ -194,6 +457,7 @@ def chatbot_start():
         
         # Store chatbot instance in session
         session['chatbot_instance'] = {
+            'session_id': uuid.uuid4().hex,
             'vehicle_price': vehicle_price,
             'vehicle_name': vehicle_name,
             'conversation_state': chatbot_instance.conversation_state.copy()
@@ -203,9 +467,10 @@ def chatbot_start():
         session.permanent = True
         
         response = chatbot_instance.start_conversation()
+        metrics.inc('chatbot_sessions_started_total')
         return jsonify(response)
     except Exception as e:
-        print(f"Error in chatbot start: {e}")
+        logger.exception("chatbot start failed")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/chatbot/respond', methods=['POST'])
@@ -226,24 +491,49 @@ def chatbot_respond():
         if not chatbot_data:
             return jsonify({'error': 'No active conversation. Please start a new conversation.'}), 400
         
-        # Create new chatbot instance with stored data
-        chatbot_instance = FinancialAdvisorChatbot(
-            vehicle_price=chatbot_data['vehicle_price'],
-            vehicle_name=chatbot_data['vehicle_name']
-        )
-        
-        # Restore conversation state
-        chatbot_instance.conversation_state = chatbot_data['conversation_state'].copy()
+        chatbot_instance = restore_chatbot(chatbot_data)
+        was_completed = chatbot_instance.conversation_state['completed']
         
         # Process response
-        response = chatbot_instance.process_response(user_response)
+        response = chatbot_instance.process_response(user_response, chatbot_data.get('session_id'))
         
         # Update session with new conversation state
         session['chatbot_instance']['conversation_state'] = chatbot_instance.conversation_state.copy()
         
+        if chatbot_instance.conversation_state['completed'] and not was_completed:
+            metrics.inc('chatbot_sessions_completed_total')
+        
+        return jsonify(response)
+    except Exception as e:
+        logger.exception("chatbot respond failed")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/chatbot/questionnaire', methods=['POST'])
+def chatbot_questionnaire():
+    """Validate a complete answer set in one request and return recommendations"""
+    if not CHATBOT:
+        return jsonify({'error': 'Chatbot service not available'}), 500
+    
+    try:
+        data = request.get_json() or {}
+        answers = data.get('answers')
+        if not isinstance(answers, dict):
+            return jsonify({'error': 'answers must be an object keyed by question'}), 400
+        
+        chatbot_instance = FinancialAdvisorChatbot(
+            vehicle_price=data.get('vehicle_price'),
+            vehicle_name=data.get('vehicle_name')
+        )
+        response = chatbot_instance.submit_answers(answers)
+        
+        if response['type'] == 'validation_errors':
+            metrics.inc('chatbot_questionnaires_total', outcome='invalid')
+            return jsonify(response), 400
+        
+        metrics.inc('chatbot_questionnaires_total', outcome='completed')
         return jsonify(response)
     except Exception as e:
-        print(f"Error in chatbot respond: {e}")
+        logger.exception("chatbot questionnaire failed")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/chatbot/summary', methods=['GET'])
@@ -255,15 +545,7 @@ def chatbot_summary():
         if not chatbot_data:
             return jsonify({'error': 'No active conversation'}), 400
         
-        # Create chatbot instance with stored data
-        chatbot_instance = FinancialAdvisorChatbot(
-            vehicle_price=chatbot_data['vehicle_price'],
-            vehicle_name=chatbot_data['vehicle_name']
-        )
-        
-        # Restore conversation state
-        chatbot_instance.conversation_state = chatbot_data['conversation_state'].copy()
-        
+        chatbot_instance = restore_chatbot(chatbot_data)
         summary = {
             'collected_data': chatbot_instance.conversation_state['collected_data'],
             'current_step': chatbot_instance.conversation_state['current_step'],
@@ -272,7 +554,7 @@ def chatbot_summary():
         
         return jsonify(summary)
     except Exception as e:
-        print(f"Error in chatbot summary: {e}")
+        logger.exception("chatbot summary failed")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/chatbot/reset', methods=['POST'])
@@ -283,7 +565,7 @@ def chatbot_reset():
         session.pop('chatbot_instance', None)
         return jsonify({'success': True})
     except Exception as e:
-        print(f"Error in chatbot reset: {e}")
+        logger.exception("chatbot reset failed")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/calculate-payment', methods=['POST'])
@@ -295,14 +577,9 @@ def calculate_payment():
     interest_rate = data.get('interest_rate', 5.5)  # annual percentage
     
     loan_amount = vehicle_price - down_payment
-    monthly_rate = interest_rate / 100 / 12
     
     # Calculate monthly payment using the standard annuity formula
-    if monthly_rate > 0:
-        monthly_payment = loan_amount * (monthly_rate * (1 + monthly_rate)**loan_term) / ((1 + monthly_rate)**loan_term - 1)
-    else:
-        # Handle zero interest rate
-        monthly_payment = loan_amount / loan_term
+    monthly_payment = annuity_payment(loan_amount, interest_rate, loan_term)
     
     total_payment = monthly_payment * loan_term
     total_interest = total_payment - loan_amount
@@ -314,121 +591,262 @@ def calculate_payment():
         'loan_amount': loan_amount
     })
 
-def get_rate_column_name(credit_score):
-    """Maps a credit score to the corresponding CSV column name for interest rate range."""
-    if credit_score >= 760:
-        return 'interest_rate_range_apy_excellent (760+)'
-    elif credit_score >= 660:
-        return 'interest_rate_range_apy_good (660-759)'
-    elif credit_score >= 580:
-        return 'interest_rate_range_apy_fair (580-659)'
-    else:
-        return 'interest_rate_range_apy_poor (<580)'
+
+def _option_query_param(data, name, cast=str):
+    """Reads a financing-options parameter from the query string, falling back to the JSON body."""
+    value = request.args.get(name)
+    if value is None:
+        value = data.get(name)
+    if value is None or value == '':
+        return None
+    if cast in (int, float):
+        return _number_field({name: value}, name, cast)
+    return cast(value)
+
+def _parse_fields(value):
+    """Option fields to project to, from a comma-separated string or a list of names; raises ValueError."""
+    if isinstance(value, str):
+        return [field.strip() for field in value.split(',') if field.strip()]
+    if isinstance(value, list) and all(isinstance(field, str) for field in value):
+        return value
+    raise ValueError('fields must be a comma-separated string or a list of field names')
+
+def _number_field(data, name, cast, default=None):
+    """A numeric JSON field cast with int or float, or default when absent; raises ValueError naming the field."""
+    value = data.get(name)
+    if value is None or value == '':
+        return default
+    error = f"{name} must be {'a whole number' if cast is int else 'a number'}"
+    try:
+        number = cast(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(error) from None
+    if not math.isfinite(number):
+        raise ValueError(error)
+    return number
+
+def _bounded_int(data, name, default, upper, lower=0):
+    """A whole-number field clamped to upper; raises ValueError naming the field if it is malformed or below lower."""
+    value = _number_field(data, name, int, default)
+    if value < lower:
+        raise ValueError(f"{name} must be at least {lower}")
+    return min(value, upper)
+
+def parse_state(value):
+    """Normalizes an optional customer state to a two-letter US code, or raises ValueError."""
+    if value is None or value == '':
+        return None
+    state = str(value).strip().upper()
+    if state not in US_STATES:
+        raise ValueError('state must be a two-letter US state code')
+    return state
+
+def encode_options_cursor(option):
+    """Opaque keyset cursor pointing just past the given option."""
+    payload = json.dumps(list(option_rank_key(option))).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+def decode_options_cursor(cursor):
+    """Inverse of encode_options_cursor; raises ValueError for malformed cursors."""
+    try:
+        monthly_payment, term, key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return (float(monthly_payment), int(term), str(key))
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
 
 
-@app.route('/api/financing-options', methods=['POST'])
 @app.route('/api/financing-options', methods=['POST'])
 def get_financing_options():
-    data = request.json
+    data = request.json or {}
     credit_score = data.get('credit_score', 700)
     vehicle_price = data.get('vehicle_price', 30000)
     down_payment = data.get('down_payment', vehicle_price * 0.1)  # Use provided down payment or default to 10%
-    
-    loan_amount = vehicle_price - down_payment
-    
-    rate_column = get_rate_column_name(credit_score)
-    # Use a dictionary to group options by a combination key
-    grouped_options = {} 
-    
-    for lender in FINANCING_LENDERS:
-        lender_name = lender.get('lender_name', 'Unknown Lender').strip()
 
-        # Get the min/max rates for the user's credit score tier
-        rate_range = parse_rate_range(lender.get(rate_column))
-        interest_rate_min = rate_range['min']
-        interest_rate_max = rate_range['max']
+    # Optional server-side filtering, pagination and projection
+    try:
+        option_type = _option_query_param(data, 'type')
+        lender_filter = _option_query_param(data, 'lender')
+        min_term = _option_query_param(data, 'min_term', int)
+        max_term = _option_query_param(data, 'max_term', int)
+        max_payment = _option_query_param(data, 'max_payment', float)
+        state = _option_query_param(data, 'state', parse_state)
+        limit = _option_query_param(data, 'limit', int)
+        cursor = _option_query_param(data, 'cursor')
+        after = decode_options_cursor(cursor) if cursor else None
+        fields = _option_query_param(data, 'fields', _parse_fields)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if option_type not in (None, 'financing', 'lease'):
+        return jsonify({'error': "type must be 'financing' or 'lease'"}), 400
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit must be at least 1'}), 400
+
+    options = build_financing_options(
+        LENDER_INDEX,
+        credit_score,
+        vehicle_price,
+        down_payment,
+        option_type=option_type,
+        lender_filter=lender_filter,
+        min_term=min_term,
+        max_term=max_term,
+        max_payment=max_payment,
+        state=state
+    )
+    total_count = len(options)
+
+    next_cursor = None
+    if limit is None and after is None:
+        # Sort options by monthly payment for best first, then by term
+        options.sort(key=lambda x: (x['monthly_payment'], x['term']))
+    else:
+        options, has_more = select_options(options, min(limit or MAX_OPTIONS_PAGE_SIZE, MAX_OPTIONS_PAGE_SIZE), after)
+        if has_more:
+            next_cursor = encode_options_cursor(options[-1])
+
+    if fields:
+        options = [{field: option[field] for field in fields if field in option} for option in options]
+
+    response = jsonify(options)
+    response.headers['X-Total-Count'] = str(total_count)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+
+@app.route('/api/compare', methods=['POST'])
+def compare_financing_options():
+    """Side-by-side comparison of selected options, identified by their financing-options keys"""
+    data = request.json or {}
+    keys = data.get('keys')
+    if not isinstance(keys, list) or not keys or not all(isinstance(key, str) for key in keys):
+        return jsonify({'error': 'keys must be a non-empty list of option keys'}), 400
+    if len(keys) > MAX_COMPARE_OPTIONS:
+        return jsonify({'error': f'At most {MAX_COMPARE_OPTIONS} options can be compared'}), 400
 
-        if interest_rate_min >= 99.0 or not lender.get('country_coverage', '').startswith('US'):
-            continue
+    credit_score = data.get('credit_score', 700)
+    vehicle_price = data.get('vehicle_price', 30000)
+    down_payment = data.get('down_payment', vehicle_price * 0.1)
+    try:
+        state = parse_state(data.get('state'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-        try:
-            terms_months = [int(t.strip()) for t in lender.get('typical_terms_months', '60, 72').split(',') if t.strip().isdigit()]
-        except ValueError:
-            terms_months = [60, 72]
-            
-        loan_types = [t.strip() for t in lender.get('loan_types_offered', '').split(',') if t.strip()]
+    options = {option['key']: option
+               for option in build_financing_options(LENDER_INDEX, credit_score, vehicle_price, down_payment, state=state)}
+    missing = [key for key in keys if key not in options]
+    if missing:
+        return jsonify({'error': 'Unknown option keys', 'missing': missing}), 400
 
-        
-        # --- Grouping Logic: Iterate over loan types and terms ---
-        for loan_type in loan_types:
-            standardized_loan_type = loan_type.lower()
-            
-            # Determine the major option type (financing or lease)
-            # This is the primary separator
-            if 'loan' in standardized_loan_type:
-                major_type = "financing"
-            elif 'lease' in standardized_loan_type:
-                major_type = "lease"
-            else:
-                continue # Skip unknown types
-
-            for term in terms_months:
-                
-                # The grouping key MUST now include the major type (financing or lease)
-                # Key: Lender + Term + Min Rate + Max Rate + Major Type
-                group_key = f"{lender_name.lower()}-{term}-{interest_rate_min}-{interest_rate_max}-{major_type}"
-
-                if group_key not in grouped_options:
-                    # --- Initial Calculation for a new group ---
-                    monthly_rate = interest_rate_min / 100 / 12
-                    
-                    if major_type == 'financing':
-                        # Payment calculation for a standard loan
-                        if monthly_rate > 0:
-                            monthly_payment = loan_amount * (monthly_rate * (1 + monthly_rate)**term) / ((1 + monthly_rate)**term - 1)
-                        else:
-                            monthly_payment = loan_amount / term
-                        total_cost = monthly_payment * term + down_payment
-                        
-                    elif major_type == 'lease':
-                        # Simplified lease calculation (1% rule approximation)
-                        monthly_base = vehicle_price * 0.01 
-                        monthly_payment = monthly_base * (1 + monthly_rate) 
-                        total_cost = monthly_payment * term # Total lease payments
-
-                    # --- Create the initial grouped option ---
-                    grouped_options[group_key] = {
-                        "bank": lender_name,
-                        "rate_min": interest_rate_min,
-                        "rate_max": interest_rate_max,
-                        "term": term,
-                        "type": major_type,
-                        # Store all individual term descriptions to be joined later
-                        "term_descriptions_list": set(), 
-                        "monthly_payment": round(monthly_payment, 2),
-                        "total_cost": round(total_cost, 2),
-                    }
-
-                # --- Aggregation Step ---
-                # Add the specific product description to the set for this group
-                current_descriptions = grouped_options[group_key]["term_descriptions_list"]
-                current_descriptions.add(loan_type.strip())
-
-
-    # --- Final Formatting and Cleanup ---
-    final_options = []
-    for key, option in grouped_options.items():
-        
-        # Join the list of descriptions into a single string for display (e.g., 'New Auto Loan, Used Auto Loan')
-        option['term_description'] = ", ".join(sorted(list(option.pop("term_descriptions_list"))))
-        
-        final_options.append(option)
-    
-    # Sort options by monthly payment for best first, then by term
-    final_options.sort(key=lambda x: (x['monthly_payment'], x['term']))
+    return jsonify(compare_options([options[key] for key in keys], vehicle_price, down_payment))
+
+
+@app.route('/api/vehicles')
+def list_vehicles():
+    """Cheapest-first catalog search with payment badges: year, body_type, max_price, limit, offset"""
+    try:
+        year = _option_query_param({}, 'year', int)
+        body_type = _option_query_param({}, 'body_type')
+        max_price = _option_query_param({}, 'max_price', float)
+        limit = _option_query_param({}, 'limit', int) or MAX_OPTIONS_PAGE_SIZE
+        offset = _option_query_param({}, 'offset', int) or 0
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if limit < 1 or offset < 0:
+        return jsonify({'error': 'limit must be at least 1 and offset non-negative'}), 400
+
+    vehicles = VEHICLE_PRICE_INDEX.find(year=year, body_type=body_type, max_price=max_price,
+                                        limit=min(limit, MAX_OPTIONS_PAGE_SIZE), offset=offset)
+    badges = PAYMENT_BADGES.badges(vehicles)
+    return jsonify([dict(vehicle, payment_badges=badge) for vehicle, badge in zip(vehicles, badges)])
+
+
+@app.route('/api/tco')
+def rank_total_cost():
+    """Catalog ranked by total cost of ownership: credit_score, years (3, 5 or 7), type, term, state, limit, offset"""
+    try:
+        state = parse_state(request.args.get('state'))
+        credit_score = _option_query_param({}, 'credit_score', int) or 700
+        years = _option_query_param({}, 'years', int) or 5
+        option_type = _option_query_param({}, 'type')
+        term = _option_query_param({}, 'term', int)
+        limit = _option_query_param({}, 'limit', int) or MAX_OPTIONS_PAGE_SIZE
+        offset = _option_query_param({}, 'offset', int) or 0
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if years * 12 not in HORIZON_MONTHS:
+        return jsonify({'error': f"years must be one of {', '.join(str(months // 12) for months in HORIZON_MONTHS)}"}), 400
+    if option_type is not None and option_type not in OPTION_TYPES:
+        return jsonify({'error': f"type must be one of {', '.join(OPTION_TYPES)}"}), 400
+    if limit < 1 or offset < 0:
+        return jsonify({'error': 'limit must be at least 1 and offset non-negative'}), 400
+
+    tco_table = TCO_TABLES.get(state)
+    if tco_table is None:
+        # Vectorized, so building a state's table on its first request is cheap
+        tco_table = TCO_TABLES[state] = TCOTable(TOYOTA_VEHICLES, LENDER_INDEX, state)
+    if term is not None and term not in tco_table.terms:
+        return jsonify({'error': f"term must be one of {', '.join(map(str, tco_table.terms))}"}), 400
+
+    tier = tier_name(get_rate_column_name(credit_score))
+    vehicles, total = tco_table.ranked(tier, years * 12, option_type, term,
+                                       limit=min(limit, MAX_OPTIONS_PAGE_SIZE), offset=offset)
+    return jsonify({
+        'credit_tier': tier,
+        'years': years,
+        'state': state,
+        # Vehicles considered; under DATA_BACKEND=sqlite the first CATALOG_LIMIT of the store
+        'catalog_size': len(tco_table),
+        'assumptions': {'annual_miles': tco_table.annual_miles, 'fuel_price': tco_table.fuel_price},
+        'total': total,
+        'vehicles': vehicles,
+    })
+
+
+@app.route('/api/affordability', methods=['POST'])
+def affordability():
+    """Find the cheapest vehicle x lender x term combinations under a monthly budget"""
+    data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    option_type = data.get('type')
+    try:
+        credit_score = _number_field(data, 'credit_score', int, 700)
+        down_payment = _number_field(data, 'down_payment', float, 0)
+        limit = _number_field(data, 'limit', int, 10)
+        state = parse_state(data.get('state'))
+        monthly_budget = _number_field(data, 'monthly_budget', float)
+        if monthly_budget is None and data.get('income'):
+            # Same 15% rule as the chatbot's personalized fallback
+            monthly_budget = _number_field(data, 'income', float) / 12 * 0.15
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if monthly_budget is None:
+        return jsonify({'error': 'monthly_budget or income is required'}), 400
+
+    if monthly_budget <= 0:
+        return jsonify({'error': 'monthly_budget must be positive'}), 400
+    if option_type not in (None, 'financing', 'lease'):
+        return jsonify({'error': "type must be 'financing' or 'lease'"}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be at least 1'}), 400
+
+    result = solve_affordability(
+        VEHICLE_PRICE_INDEX,
+        LENDER_INDEX,
+        monthly_budget,
+        credit_score=credit_score,
+        down_payment=down_payment,
+        option_type=option_type,
+        limit=min(limit, 100),
+        state=state
+    )
+    return jsonify(result)
+
+if WARMUP['enabled']:
+    warm_up()
 
-    return jsonify(final_options)
-    
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5002))
     debug = True  # Force debug mode for template reloading
@@ -0,0 +1,242 @@
+"""
+ASGI entry point with event-loop handling for the LLM-bound chatbot routes
+
+POST /api/chatbot/respond and /api/chatbot/questionnaire are served directly on
+the event loop and await Gemini asynchronously, so a conversation waiting on
+the model costs a coroutine rather than a server thread. Every other route,
+including the quote endpoints, is passed through to the Flask app on a
+bounded thread pool (WSGI_THREADS). Sessions use Flask's signed cookie, so
+both sides share conversation state.
+
+The async routes' responses are finished by the Flask app's after_request
+hooks and session saving, so they carry the same CORS headers, Set-Cookie and
+http_request_duration_seconds samples as the Flask routes. They are not
+profiled: cProfile can't attribute time on a shared event loop.
+
+    uvicorn src.asgi:application --host 0.0.0.0 --port 5002
+"""
+
+import asyncio
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import g, session as flask_session
+from werkzeug.http import parse_cookie
+from itsdangerous import BadSignature
+
+from . import metrics
+from .app import CHATBOT, app as flask_app, restore_chatbot
+from .chatbot_service import FinancialAdvisorChatbot
+from .logging_service import get_logger
+
+logger = get_logger(__name__)
+
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class JSONResponse(Exception):
+    """Raised by a handler to return early with a status and payload."""
+
+    def __init__(self, status: int, payload: dict):
+        self.status = status
+        self.payload = payload
+
+
+# --- Session Cookie ---
+
+def load_session(headers: dict):
+    """Reads the Flask session cookie, returning an empty session if it's missing or invalid."""
+    interface = flask_app.session_interface
+    session = interface.session_class()
+    cookie = parse_cookie(headers.get(b'cookie', b'').decode('latin-1')).get(interface.get_cookie_name(flask_app))
+    if cookie:
+        serializer = interface.get_signing_serializer(flask_app)
+        max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+        try:
+            session = interface.session_class(serializer.loads(cookie, max_age=max_age))
+        except BadSignature:
+            pass
+    return session
+
+
+# --- Async Chatbot Handlers ---
+
+async def chatbot_respond(data: dict, session) -> dict:
+    """Async /api/chatbot/respond: same contract as the Flask route"""
+    user_response = data.get('response', '')
+    if not user_response:
+        raise JSONResponse(400, {'error': 'Response is required'})
+
+    chatbot_data = session.get('chatbot_instance')
+    if not chatbot_data:
+        raise JSONResponse(400, {'error': 'No active conversation. Please start a new conversation.'})
+
+    chatbot_instance = restore_chatbot(chatbot_data)
+    was_completed = chatbot_instance.conversation_state['completed']
+
+    response = await chatbot_instance.process_response_async(user_response, chatbot_data.get('session_id'))
+
+    chatbot_data['conversation_state'] = chatbot_instance.conversation_state.copy()
+    session['chatbot_instance'] = chatbot_data
+
+    if chatbot_instance.conversation_state['completed'] and not was_completed:
+        metrics.inc('chatbot_sessions_completed_total')
+    return response
+
+async def chatbot_questionnaire(data: dict, session) -> dict:
+    """Async /api/chatbot/questionnaire: same contract as the Flask route"""
+    answers = data.get('answers')
+    if not isinstance(answers, dict):
+        raise JSONResponse(400, {'error': 'answers must be an object keyed by question'})
+
+    chatbot_instance = FinancialAdvisorChatbot(
+        vehicle_price=data.get('vehicle_price'),
+        vehicle_name=data.get('vehicle_name')
+    )
+    response = await chatbot_instance.submit_answers_async(answers)
+
+    if response['type'] == 'validation_errors':
+        metrics.inc('chatbot_questionnaires_total', outcome='invalid')
+        raise JSONResponse(400, response)
+    metrics.inc('chatbot_questionnaires_total', outcome='completed')
+    return response
+
+ASYNC_ROUTES = {
+    ('POST', '/api/chatbot/respond'): chatbot_respond,
+    ('POST', '/api/chatbot/questionnaire'): chatbot_questionnaire,
+}
+
+
+# --- ASGI Application ---
+
+async def _read_body(receive, limit=None) -> bytes:
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if limit is not None and len(body) > limit:
+            raise JSONResponse(413, {'error': 'Request body too large'})
+        if not message.get('more_body'):
+            return body
+
+def finish_response(scope, start: float, status: int, payload: dict, session):
+    """
+    Runs an async route's JSON result through the Flask app's after_request hooks
+    (CORS, request metrics) and session saving, as for a Flask route. Returns
+    (status, headers, body).
+    """
+    with flask_app.request_context(build_environ(scope, b'')):
+        g.request_start = start
+        if session.modified:
+            flask_session.clear()
+            flask_session.update(session)
+        response = flask_app.response_class(flask_app.json.dumps(payload), status=status,
+                                            mimetype='application/json')
+        response = flask_app.process_response(response)
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.items()]
+        return response.status_code, headers, response.get_data()
+
+
+# --- WSGI Bridge ---
+
+def build_environ(scope, body: bytes) -> dict:
+    """Translates an ASGI HTTP scope and its body into a WSGI environ."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope['headers']:
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def run_wsgi(wsgi_app, environ: dict):
+    """Calls a WSGI app and returns (status, headers, body) with the body fully buffered."""
+    response = {}
+    chunks = []
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        return chunks.append
+
+    result = wsgi_app(environ, start_response)
+    try:
+        chunks.extend(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], b''.join(chunks)
+
+
+class ChatbotASGI:
+    """Serves ASYNC_ROUTES on the event loop and passes everything else to the WSGI app."""
+
+    def __init__(self, wsgi_app, wsgi_threads: int = 32):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=wsgi_threads, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return  # No lifespan or websocket handling; servers treat that as unsupported
+        handler = ASYNC_ROUTES.get((scope['method'], scope['path']))
+        if handler is None:
+            await self.call_wsgi(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        session = load_session(dict(scope['headers']))
+        try:
+            if not CHATBOT:
+                raise JSONResponse(500, {'error': 'Chatbot service not available'})
+            try:
+                data = flask_app.json.loads(await _read_body(receive, MAX_BODY_BYTES) or b'{}')
+            except ValueError:
+                raise JSONResponse(400, {'error': 'Request body must be JSON'})
+            if not isinstance(data, dict):
+                raise JSONResponse(400, {'error': 'Request body must be a JSON object'})
+            status, payload = 200, await handler(data, session)
+        except JSONResponse as early:
+            status, payload = early.status, early.payload
+        except Exception as e:
+            logger.exception("async chatbot route failed", path=scope['path'])
+            status, payload = 500, {'error': str(e)}
+
+        status, headers, body = finish_response(scope, start, status, payload, session)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def call_wsgi(self, scope, receive, send):
+        environ = build_environ(scope, await _read_body(receive))
+        loop = asyncio.get_running_loop()
+        status, headers, body = await loop.run_in_executor(self.executor, run_wsgi, self.wsgi_app, environ)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+application = ChatbotASGI(flask_app, int(os.environ.get('WSGI_THREADS', 32)))
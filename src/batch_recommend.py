@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Batch recommendations for stored customer profiles
+
+Streams profiles from CSV or JSONL (one column/key per chatbot question, plus an
+id), validates them with the chatbot's rules and writes one JSON line per
+profile. The default rules mode runs the deterministic personalized fallback in
+a process pool; llm mode calls Gemini through the shared gateway with bounded
+concurrency. Output is appended and flushed as results complete, in input
+order, so an interrupted run continues with --resume. In llm mode a profile the
+gateway shed or the model failed on is written with status 'retry' and no
+recommendations, and --resume asks again for it.
+
+    python -m src.batch_recommend profiles.csv --output recommendations.jsonl
+    python -m src.batch_recommend profiles.jsonl --output recs.jsonl --mode llm --concurrency 8 --resume
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .chatbot_service import FinancialAdvisorChatbot
+
+# Per-process chatbot used by rules-mode workers (validation tables only, no Gemini client)
+_WORKER_CHATBOT: Optional[FinancialAdvisorChatbot] = None
+# Response sources where rule-based advice stood in for the model
+_RETRY_SOURCES = ('shed', 'error', 'invalid_json')
+# Statuses that --resume treats as done
+_FINAL_STATUSES = ('ok', 'invalid')
+
+
+# --- Input ---
+
+def read_profiles(path: str, id_field: str) -> Iterator[Dict]:
+    """Yields profiles one at a time from a .csv or .jsonl file, adding an 'id' to each."""
+    is_csv = path.lower().endswith('.csv')
+    with open(path, newline='' if is_csv else None, encoding='utf-8') as f:
+        rows = csv.DictReader(f) if is_csv else (json.loads(line) for line in f if line.strip())
+        for line_number, row in enumerate(rows, start=1):
+            row['id'] = str(row.get(id_field) or line_number)
+            yield row
+
+def completed_ids(output_path: str) -> Set[str]:
+    """
+    Ids an earlier run finished (ok or invalid; 'retry' rows are asked again). A
+    torn final line left by a crash is cut off so appended results start on a
+    clean line.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'rb+') as f:
+        complete_bytes = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            complete_bytes += len(line)
+            try:
+                result = json.loads(line)
+                if result['status'] in _FINAL_STATUSES:
+                    done.add(result['id'])
+            except (ValueError, KeyError, TypeError):
+                continue
+        f.truncate(complete_bytes)
+    return done
+
+def batched(profiles: Iterator[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for profile in profiles:
+        batch.append(profile)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- Workers ---
+
+def _result(profile: Dict, chatbot: FinancialAdvisorChatbot, response: Optional[Dict]) -> Dict:
+    if response is not None:
+        return {'id': profile['id'], 'status': 'invalid', 'errors': response['errors']}
+    return {
+        'id': profile['id'],
+        'status': 'ok',
+        'user_data': chatbot.conversation_state['collected_data'],
+    }
+
+def _init_rules_worker():
+    global _WORKER_CHATBOT
+    _WORKER_CHATBOT = FinancialAdvisorChatbot(offline=True)
+
+def recommend_rules_batch(profiles: List[Dict]) -> List[Dict]:
+    """Validates a batch and builds rule-based recommendations (runs in a worker process)."""
+    chatbot = _WORKER_CHATBOT
+    results = []
+    for profile in profiles:
+        response = chatbot._apply_answers(profile)
+        result = _result(profile, chatbot, response)
+        if result['status'] == 'ok':
+            result['source'] = 'rules'
+            result['recommendations'] = FinancialAdvisorChatbot._generate_personalized_fallback(result['user_data'])
+        results.append(result)
+    return results
+
+def recommend_llm_batch(profiles: List[Dict]) -> List[Dict]:
+    """Validates a batch and asks Gemini for recommendations (runs in a thread)."""
+    results = []
+    for profile in profiles:
+        chatbot = FinancialAdvisorChatbot(vehicle_price=profile.get('vehicle_price'),
+                                          vehicle_name=profile.get('vehicle_name'))
+        response = chatbot._apply_answers(profile)
+        result = _result(profile, chatbot, response)
+        if result['status'] == 'ok':
+            answer = chatbot._request_recommendations()
+            result['source'] = answer['source']
+            if answer['source'] in _RETRY_SOURCES:
+                result['status'] = 'retry'
+            else:
+                result['recommendations'] = answer['recommendations']
+        results.append(result)
+    return results
+
+
+# --- Driver ---
+
+def run_batch(input_path: str, output_path: str, mode: str = 'rules', workers: Optional[int] = None,
+              concurrency: int = 8, batch_size: int = 200, id_field: str = 'customer_id',
+              resume: bool = False) -> Tuple[int, int, int, int]:
+    """
+    Runs the batch and returns (written, invalid, retry, skipped). At most twice the
+    worker count of batches are in flight, so memory stays flat however large
+    the input is, and results are written in input order as each batch completes.
+    """
+    skip = completed_ids(output_path) if resume else set()
+    profiles = (profile for profile in read_profiles(input_path, id_field) if profile['id'] not in skip)
+
+    if mode == 'rules':
+        worker_count = workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(max_workers=worker_count, initializer=_init_rules_worker)
+        task = recommend_rules_batch
+    else:
+        # Each thread handles one profile at a time; the LLM gateway enforces the global limits
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        worker_count = concurrency
+        batch_size = 1
+        task = recommend_llm_batch
+
+    written = invalid = retry = 0
+    window = deque()
+    with executor, open(output_path, 'a' if resume else 'w', encoding='utf-8') as output:
+        def drain_one():
+            nonlocal written, invalid, retry
+            for result in window.popleft().result():
+                output.write(json.dumps(result) + '\n')
+                written += 1
+                invalid += result['status'] == 'invalid'
+                retry += result['status'] == 'retry'
+            output.flush()
+
+        for batch in batched(profiles, batch_size):
+            window.append(executor.submit(task, batch))
+            if len(window) >= worker_count * 2:
+                drain_one()
+        while window:
+            drain_one()
+
+    return written, invalid, retry, len(skip)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Batch recommendations for stored customer profiles')
+    parser.add_argument('input', help='profiles as .csv or .jsonl')
+    parser.add_argument('--output', required=True, help='JSONL results file')
+    parser.add_argument('--mode', choices=['rules', 'llm'], default='rules',
+                        help='rule-based recommendations in a process pool, or Gemini (default: %(default)s)')
+    parser.add_argument('--workers', type=int, help='rules-mode worker processes (default: CPU count)')
+    parser.add_argument('--concurrency', type=int, default=8, help='llm-mode concurrent requests (default: %(default)s)')
+    parser.add_argument('--batch-size', type=int, default=200, help='profiles per rules-mode task (default: %(default)s)')
+    parser.add_argument('--id-field', default='customer_id', help='profile id column (default: %(default)s)')
+    parser.add_argument('--resume', action='store_true',
+                        help='skip ids already finished in --output and append to it')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    written, invalid, retry, skipped = run_batch(args.input, args.output, args.mode, args.workers, args.concurrency,
+                                          args.batch_size, args.id_field, args.resume)
+    elapsed = time.perf_counter() - start
+    print(f"{written} profiles in {elapsed:.1f}s ({written / elapsed if elapsed else 0:.0f}/s), "
+          f"{invalid} invalid, {retry} to retry, {skipped} skipped as already done", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Bulk quoting of lead lists against the full vehicle inventory
+
+Streams customers (customer_id, credit_score, optional down_payment and state)
+from CSV or JSONL and prices every customer against every vehicle with the
+same lender rules as /api/financing-options, emitting the best financing and
+best lease offer per customer and vehicle.
+
+The run has two phases. Leads are first split into shards of one credit tier
+each. The shards are then quoted in a process pool, each worker reusing that
+tier's precomputed lender/term payment factors (BestOfferTable). Every shard
+writes its own part file and renames it into place when complete, so
+re-running the same command only quotes the shards that are still missing.
+
+    python -m src.bulk_quote leads.csv --output-dir quotes/
+    python -m src.bulk_quote leads.jsonl --output-dir quotes/ --format parquet --workers 8
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:  # Parquet output is optional
+    pyarrow = None
+
+from .quote_engine import US_STATES, BestOfferTable, LenderIndex, get_rate_column_name, tier_name
+
+OUTPUT_COLUMNS = [
+    'customer_id', 'credit_tier', 'state', 'year', 'model', 'trim', 'vehicle_price', 'down_payment',
+    'type', 'bank', 'term', 'rate', 'monthly_payment', 'total_cost', 'offer_key',
+]
+MANIFEST_NAME = 'MANIFEST.json'
+PARQUET_ROW_GROUP = 65536
+
+if pyarrow is not None:
+    PARQUET_SCHEMA = pyarrow.schema([
+        ('customer_id', pyarrow.string()), ('credit_tier', pyarrow.string()), ('state', pyarrow.string()),
+        ('year', pyarrow.int32()), ('model', pyarrow.string()), ('trim', pyarrow.string()),
+        ('vehicle_price', pyarrow.float64()), ('down_payment', pyarrow.float64()), ('type', pyarrow.string()),
+        ('bank', pyarrow.string()), ('term', pyarrow.int32()), ('rate', pyarrow.float64()),
+        ('monthly_payment', pyarrow.float64()), ('total_cost', pyarrow.float64()), ('offer_key', pyarrow.string()),
+    ])
+
+# Set in each worker process by _init_worker
+_VEHICLES: List[Dict] = []
+_OFFERS: Optional[BestOfferTable] = None
+
+
+# --- Phase 1: Split Leads by Credit Tier ---
+
+def read_leads(path: str) -> Iterator[Dict]:
+    is_csv = path.lower().endswith('.csv')
+    with open(path, newline='' if is_csv else None, encoding='utf-8') as f:
+        rows = csv.DictReader(f) if is_csv else (json.loads(line) for line in f if line.strip())
+        for line_number, row in enumerate(rows, start=1):
+            try:
+                credit_score = int(float(row.get('credit_score') or 700))
+            except ValueError:
+                credit_score = 700
+            down_payment = row.get('down_payment')
+            state = (row.get('state') or '').strip().upper()
+            yield {
+                'customer_id': str(row.get('customer_id') or line_number),
+                'credit_score': credit_score,
+                'down_payment': float(down_payment) if down_payment not in (None, '') else None,
+                'state': state if state in US_STATES else None,
+            }
+
+def split_leads(input_path: str, shard_dir: str, shard_size: int) -> List[str]:
+    """
+    Writes leads into per-tier JSONL shards of at most shard_size customers and
+    records them in a manifest. A completed split is reused on restart.
+    """
+    manifest_path = os.path.join(shard_dir, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            return json.load(f)['shards']
+
+    os.makedirs(shard_dir, exist_ok=True)
+    shards = []
+    open_shards = {}  # tier -> [open shard file, leads written]
+
+    def roll(tier):
+        shard_name = f"{tier}-{sum(1 for name in shards if name.startswith(tier + '-')):05d}"
+        shards.append(shard_name)
+        open_shards[tier] = [open(os.path.join(shard_dir, shard_name + '.jsonl'), 'w', encoding='utf-8'), 0]
+
+    try:
+        for lead in read_leads(input_path):
+            tier = tier_name(get_rate_column_name(lead['credit_score']))
+            if tier not in open_shards or open_shards[tier][1] >= shard_size:
+                if tier in open_shards:
+                    open_shards[tier][0].close()
+                roll(tier)
+            shard = open_shards[tier]
+            shard[0].write(json.dumps(lead) + '\n')
+            shard[1] += 1
+    finally:
+        for shard_file, _ in open_shards.values():
+            shard_file.close()
+
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'input': os.path.abspath(input_path), 'shards': shards}, f)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return shards
+
+
+# --- Phase 2: Quote Shards ---
+
+def _init_worker(vehicles: List[Dict], lender_index: LenderIndex, min_term, max_term):
+    global _VEHICLES, _OFFERS
+    _VEHICLES = vehicles
+    _OFFERS = BestOfferTable(lender_index, min_term=min_term, max_term=max_term)
+
+def iter_quotes(leads: Iterator[Dict]) -> Iterator[tuple]:
+    """Yields one output row per customer x vehicle x offer type, in OUTPUT_COLUMNS order."""
+    for lead in leads:
+        rate_column = get_rate_column_name(lead['credit_score'])
+        tier = tier_name(rate_column)
+        for vehicle in _VEHICLES:
+            price = vehicle['price']
+            down_payment = lead['down_payment'] if lead['down_payment'] is not None else price * 0.1
+            # Leads without a state only get lenders that cover every state
+            quotes = _OFFERS.quote(rate_column, price, down_payment, lead['state'], nationwide_only=lead['state'] is None)
+            for major_type, offer in quotes.items():
+                if offer is None:
+                    continue
+                yield (lead['customer_id'], tier, lead['state'], vehicle['year'], vehicle['model'], vehicle['trim'],
+                       price, round(down_payment, 2), major_type, offer['bank'], offer['term'], offer['rate_min'],
+                       offer['monthly_payment'], offer['total_cost'], offer['key'])
+
+def _write_csv(path: str, rows: Iterator[tuple]) -> int:
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(OUTPUT_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+def _write_parquet(path: str, rows: Iterator[tuple]) -> int:
+    count = 0
+    with parquet.ParquetWriter(path, PARQUET_SCHEMA) as writer:
+        while True:
+            batch = list(itertools.islice(rows, PARQUET_ROW_GROUP))
+            if not batch:
+                break
+            columns = [pyarrow.array(values, type=field.type) for values, field in zip(zip(*batch), PARQUET_SCHEMA)]
+            writer.write_table(pyarrow.Table.from_arrays(columns, schema=PARQUET_SCHEMA))
+            count += len(batch)
+    return count
+
+def quote_shard(shard_dir: str, output_dir: str, shard_name: str, output_format: str) -> int:
+    """Quotes one shard into its part file; the rename marks the shard as done."""
+    final_path = os.path.join(output_dir, f"part-{shard_name}.{output_format}")
+    temp_path = final_path + '.tmp'
+    with open(os.path.join(shard_dir, shard_name + '.jsonl'), encoding='utf-8') as f:
+        rows = iter_quotes(json.loads(line) for line in f)
+        count = (_write_parquet if output_format == 'parquet' else _write_csv)(temp_path, rows)
+    os.replace(temp_path, final_path)
+    return count
+
+
+def run_bulk_quote(input_path: str, output_dir: str, vehicles: List[Dict], lender_index: LenderIndex,
+                   output_format: str = 'csv', workers: Optional[int] = None, shard_size: int = 5000,
+                   min_term=None, max_term=None) -> Dict:
+    """Splits and quotes the leads, skipping shards finished by an earlier run."""
+    shard_dir = os.path.join(output_dir, '_shards')
+    shards = split_leads(input_path, shard_dir, shard_size)
+    pending = [name for name in shards
+               if not os.path.exists(os.path.join(output_dir, f"part-{name}.{output_format}"))]
+
+    quotes = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=_init_worker,
+                             initargs=(vehicles, lender_index, min_term, max_term)) as pool:
+        futures = [pool.submit(quote_shard, shard_dir, output_dir, name, output_format) for name in pending]
+        for future in futures:
+            quotes += future.result()
+
+    return {'shards': len(shards), 'quoted_shards': len(pending), 'quotes': quotes}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-quote a lead list against the vehicle inventory')
+    parser.add_argument('input', help='leads as .csv or .jsonl (customer_id, credit_score, down_payment, state)')
+    parser.add_argument('--output-dir', required=True, help='directory for part files (reused to resume)')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help='part file format (default: %(default)s)')
+    parser.add_argument('--workers', type=int, help='worker processes (default: CPU count)')
+    parser.add_argument('--shard-size', type=int, default=5000, help='customers per shard (default: %(default)s)')
+    parser.add_argument('--min-term', type=int, help='only consider terms of at least this many months')
+    parser.add_argument('--max-term', type=int, help='only consider terms of at most this many months')
+    parser.add_argument('--vehicles', help='vehicle CSV (default: the app data file)')
+    parser.add_argument('--lenders', help='lender CSV (default: the app data file)')
+    args = parser.parse_args(argv)
+
+    if args.format == 'parquet' and pyarrow is None:
+        parser.error('--format parquet needs pyarrow installed')
+
+    # The app module loads the default data files on import
+    from . import app as app_module
+    vehicles = app_module.load_vehicles_from_csv(args.vehicles) if args.vehicles else app_module.TOYOTA_VEHICLES
+    lenders = app_module.load_financing_data(args.lenders) if args.lenders else app_module.financing_lenders()
+
+    start = time.perf_counter()
+    summary = run_bulk_quote(args.input, args.output_dir, vehicles, LenderIndex(lenders), args.format,
+                             args.workers, args.shard_size, args.min_term, args.max_term)
+    elapsed = time.perf_counter() - start
+    print(f"{summary['quotes']} quotes from {summary['quoted_shards']}/{summary['shards']} shards in {elapsed:.1f}s "
+          f"({summary['quotes'] / elapsed if elapsed else 0:.0f} quotes/s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
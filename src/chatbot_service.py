@@ -3,20 +3,139 @@ Financial Advisor Chatbot Service using Google Gemini API
 """
 
 import google.generativeai as genai
+from google.generativeai import client as genai_client
+import asyncio
+import copy
 import os
 import json
+import hashlib
+import threading
 from typing import Dict, List, Optional, Tuple
 
+from . import metrics
+from .answer_rules import INVALID_RESPONSES, RangeError, parse_amount, parse_amount_range, validate_choice
+from .llm_gateway import GATEWAY, LLMGateway, LLMOverloaded
+from .gemini_rest import generate_content_rest
+from .single_flight import AsyncSingleFlight, SingleFlight
+from .recommendation_router import ROUTE_FAST, ROUTE_RULES, RecommendationRouter, Route
+from .speculation import Speculator
+from .logging_service import get_logger
+
+logger = get_logger(__name__)
+
+GEMINI_MODEL = 'gemini-2.5-flash'
+# Model and settings for borderline profiles routed to the fast tier
+GEMINI_FAST_MODEL = os.environ.get('GEMINI_FAST_MODEL', 'gemini-2.5-flash-lite')
+# Only fields known to the pinned SDK's GenerationConfig; the JSON is extracted as for the full
+# tier, and an answer cut short by the token limit falls back like any other invalid JSON
+FAST_GENERATION_CONFIG = {
+    'max_output_tokens': int(os.environ.get('GEMINI_FAST_MAX_OUTPUT_TOKENS', 4096)),
+}
+
+# Scores completed profiles into the rules, fast or full tier
+_ROUTER = RecommendationRouter.from_env()
+
+# In-flight recommendation calls shared by duplicate requests (double clicks, retries, reloads)
+_RECOMMENDATION_FLIGHTS = SingleFlight()
+_ASYNC_RECOMMENDATION_FLIGHTS = AsyncSingleFlight()
+metrics.gauge('recommendation_in_flight', 'Distinct recommendation calls currently running.',
+              lambda: len(_RECOMMENDATION_FLIGHTS) + len(_ASYNC_RECOMMENDATION_FLIGHTS))
+metrics.REGISTRY.describe('recommendation_coalesced_total', 'counter',
+                          'Recommendation requests that reused an identical in-flight call.')
+
+# Background recommendations for the likeliest final answers (SPECULATIVE_RECOMMENDATIONS=1)
+_SPECULATOR = Speculator.from_env(has_headroom=GATEWAY.has_spare_capacity)
+
+# JSON shape both the full and the compact prompt ask the model for
+_RESPONSE_FORMAT = """Format your response as JSON with this structure:
+            {
+                "recommendation": "Specific financing or leasing recommendation with brief reasoning",
+                "reasoning": "Detailed financial analysis explaining the recommendation based on debt-to-income, credit score, employment stability, and Toyota-specific factors",
+                "financial_analysis": {
+                    "debt_to_income_ratio": "calculated percentage and assessment",
+                    "affordable_monthly_payment": "maximum recommended payment",
+                    "credit_tier": "excellent/good/fair/poor with implications",
+                    "risk_level": "low/medium/high with explanation"
+                },
+                "tips": [
+                    "Specific, actionable tip 1",
+                    "Specific, actionable tip 2", 
+                    "Specific, actionable tip 3",
+                    "Toyota-specific tip or program"
+                ],
+                "suggested_terms": {
+                    "loan_term": "specific term recommendation (e.g., '60 months for optimal rate vs payment balance')",
+                    "down_payment": "specific amount or percentage with reasoning",
+                    "financing_type": "financing or lease with detailed justification",
+                    "interest_rate_range": "expected rate range based on credit score"
+                },
+                "concerns": [
+                    "Any financial red flags or areas needing attention"
+                ],
+                "next_steps": [
+                    "Immediate actionable step 1",
+                    "Immediate actionable step 2",
+                    "Toyota Financial Services specific action"
+                ],
+                "toyota_advantages": [
+                    "Specific Toyota Financial Services benefits for this customer"
+                ]
+            }"""
+
+_GENAI_CONFIG = None
+_GENAI_CONFIG_LOCK = threading.Lock()
+
+def configure_genai(api_key: str, api_endpoint: Optional[str] = None):
+    """
+    Configure the Gemini SDK once per distinct key/endpoint. Reconfiguring drops
+    the SDK's cached client, so doing it per request would discard the open
+    connection every time.
+    """
+    global _GENAI_CONFIG
+    with _GENAI_CONFIG_LOCK:
+        if _GENAI_CONFIG == (api_key, api_endpoint):
+            return
+        # GEMINI_API_ENDPOINT points the SDK at another host (e.g. the local
+        # fake Gemini server used for load testing) over the REST transport
+        if api_endpoint:
+            genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': api_endpoint})
+        else:
+            genai.configure(api_key=api_key)
+        _GENAI_CONFIG = (api_key, api_endpoint)
+
+def warm_up_client() -> bool:
+    """Create the SDK's generation client ahead of the first request; True if it is ready."""
+    if _GENAI_CONFIG is None:
+        return False
+    try:
+        genai_client.get_default_generative_client()
+        return True
+    except Exception as e:
+        logger.warning("gemini client warm-up failed", error=str(e))
+        return False
+
 class FinancialAdvisorChatbot:
-    def __init__(self, vehicle_price=None, vehicle_name=None):
-        """Initialize the chatbot with Gemini API and optional vehicle information"""
-        # Set up Gemini API
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY environment variable is required")
-        
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+    def __init__(self, vehicle_price=None, vehicle_name=None, offline=False, gateway: Optional[LLMGateway] = None):
+        """
+        Initialize the chatbot with Gemini API and optional vehicle information.
+        offline=True skips the Gemini setup for callers that only validate answers
+        and use the rule-based recommendations (e.g. batch jobs). gateway replaces
+        the process-wide GATEWAY, e.g. with LLMGateway.unbounded() for stubbed models.
+        """
+        self.model = self.fast_model = self.api_key = self.api_endpoint = None
+        self.gateway = gateway or GATEWAY
+        if not offline:
+            # Set up Gemini API
+            api_key = os.getenv('GEMINI_API_KEY')
+            if not api_key:
+                raise ValueError("GEMINI_API_KEY environment variable is required")
+            
+            api_endpoint = os.getenv('GEMINI_API_ENDPOINT')
+            configure_genai(api_key, api_endpoint)
+            self.model = genai.GenerativeModel(GEMINI_MODEL)
+            self.fast_model = genai.GenerativeModel(GEMINI_FAST_MODEL, generation_config=FAST_GENERATION_CONFIG)
+            self.api_key = api_key
+            self.api_endpoint = api_endpoint
         
         # Store vehicle information
         self.vehicle_price = vehicle_price
@@ -130,10 +249,34 @@ class FinancialAdvisorChatbot:
         
         return self._get_next_question()
 
+    def _prefill_vehicle(self):
+        """A vehicle sent with a questionnaire already answers vehicle_preference"""
+        if self.vehicle_name and self.vehicle_price:
+            self.conversation_state['collected_data']['vehicle_preference'] = self.vehicle_name
+            self.conversation_state['collected_data']['vehicle_price'] = self.vehicle_price
+            if 'vehicle_preference' in self.conversation_state['question_flow']:
+                self.conversation_state['question_flow'].remove('vehicle_preference')
+
     def process_response(self, user_response: str, session_id: str = None) -> Dict:
         """Process user response and return next question or recommendations"""
+        response = self._record_response(user_response)
+        if response is None:
+            return self._generate_recommendations(session_id)
+        self._maybe_speculate(session_id)
+        return response
+
+    async def process_response_async(self, user_response: str, session_id: str = None) -> Dict:
+        """process_response for the async serving mode; awaits the LLM instead of blocking"""
+        response = self._record_response(user_response)
+        if response is None:
+            return await self._generate_recommendations_async(session_id)
+        self._maybe_speculate(session_id)
+        return response
+
+    def _record_response(self, user_response: str) -> Optional[Dict]:
+        """Validate and store one answer; returns the next reply, or None once recommendations are due"""
         if self.conversation_state['completed']:
-            return self._generate_recommendations()
+            return None
         
         current_question_key = self.conversation_state['question_flow'][self.conversation_state['current_step']]
         
@@ -161,10 +304,73 @@ class FinancialAdvisorChatbot:
         
         if self.conversation_state['current_step'] >= len(self.conversation_state['question_flow']):
             self.conversation_state['completed'] = True
-            return self._generate_recommendations()
+            return None
         else:
             return self._get_next_question()
 
+    def validate_answers(self, answers: Dict) -> Tuple[Dict, Dict]:
+        """
+        Validate a complete answer set in one pass.
+
+        Returns (processed_values, errors) where errors maps each invalid or
+        missing question key to its message and help text.
+        """
+        processed = {}
+        errors = {}
+        for question_key in self.conversation_state['question_flow']:
+            value = answers.get(question_key)
+            # JSON clients may send 720.0 for 720; the validators expect whole numbers as digits
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            if value is None or str(value).strip() == '':
+                errors[question_key] = {
+                    'message': f"An answer for '{question_key}' is required.",
+                    'help_text': self.question_templates[question_key]['question']
+                }
+                continue
+            
+            validation_result = self._validate_response(str(value), question_key)
+            if validation_result['valid']:
+                processed[question_key] = validation_result['processed_value']
+            else:
+                errors[question_key] = {
+                    'message': validation_result['message'],
+                    'help_text': validation_result.get('help_text', '')
+                }
+        return processed, errors
+
+    def submit_answers(self, answers: Dict) -> Dict:
+        """Answer the whole questionnaire at once and go straight to recommendations"""
+        response = self._apply_answers(answers)
+        if response is None:
+            return self._generate_recommendations()
+        return response
+
+    async def submit_answers_async(self, answers: Dict) -> Dict:
+        """submit_answers for the async serving mode"""
+        response = self._apply_answers(answers)
+        if response is None:
+            return await self._generate_recommendations_async()
+        return response
+
+    def _apply_answers(self, answers: Dict) -> Optional[Dict]:
+        """Validate and store a full answer set; returns the validation errors, or None if complete"""
+        self.reset_conversation()
+        self._prefill_vehicle()
+        processed, errors = self.validate_answers(answers)
+        
+        if errors:
+            return {
+                'type': 'validation_errors',
+                'errors': errors,
+                'total_steps': len(self.conversation_state['question_flow'])
+            }
+        
+        self.conversation_state['collected_data'].update(processed)
+        self.conversation_state['current_step'] = len(self.conversation_state['question_flow'])
+        self.conversation_state['completed'] = True
+        return None
+
     def _validate_response(self, user_response: str, question_key: str) -> Dict:
         """Validate user response based on question type and return validation result"""
         user_response = user_response.strip()
@@ -177,8 +383,7 @@ class FinancialAdvisorChatbot:
             }
         
         # Check for obviously invalid responses
-        invalid_responses = ['asdf', 'qwerty', '123', 'abc', 'test', 'hello', 'hi', 'yes', 'no', 'maybe', 'idk', 'dunno', 'whatever']
-        if user_response.lower() in invalid_responses:
+        if user_response.lower() in INVALID_RESPONSES:
             return {
                 'valid': False,
                 'message': f"I understand you might be unsure, but '{user_response}' isn't a valid response for this question.",
@@ -186,170 +391,86 @@ class FinancialAdvisorChatbot:
             }
         
         # Question-specific validation
-        if question_key == 'income':
-            return self._validate_income(user_response)
-        elif question_key == 'credit_score':
-            return self._validate_credit_score(user_response)
-        elif question_key == 'housing_status':
-            return self._validate_housing_status(user_response)
-        elif question_key == 'employment_status':
-            return self._validate_employment_status(user_response)
-        elif question_key == 'down_payment':
-            return self._validate_down_payment(user_response)
-        elif question_key == 'loan_preference':
-            return self._validate_loan_preference(user_response)
-        elif question_key == 'vehicle_preference':
-            return self._validate_vehicle_preference(user_response)
+        validator = self._VALIDATORS.get(question_key)
+        if validator is not None:
+            return validator(self, user_response)
         
         return {'valid': True, 'processed_value': user_response}
     
     def _validate_income(self, response: str) -> Dict:
         """Validate income input"""
         try:
-            # Remove common currency symbols and commas
-            cleaned = response.replace('$', '').replace(',', '').replace('k', '000').replace('K', '000')
-            
-            # Handle ranges like "50-60k"
-            if '-' in cleaned:
-                parts = cleaned.split('-')
-                if len(parts) == 2:
-                    low = float(parts[0].strip())
-                    high = float(parts[1].strip())
-                    income = (low + high) / 2
-                else:
-                    return {'valid': False, 'message': "Please enter a single income amount, not a range.", 'help_text': "Example: 75000 or 75k"}
-            else:
-                income = float(cleaned)
-            
-            if income < 10000:
-                return {'valid': False, 'message': "That income seems too low for vehicle financing. Please enter your actual annual household income.", 'help_text': "Include all sources of income for your household."}
-            elif income > 1000000:
-                return {'valid': False, 'message': "That income seems unusually high. Please double-check and enter your actual annual household income.", 'help_text': "Enter your total household income before taxes."}
-            
-            return {'valid': True, 'processed_value': str(int(income))}
-            
+            # Handles currency symbols, commas, 'k' amounts and ranges like "50-60k"
+            income = parse_amount_range(response)
+        except RangeError:
+            return {'valid': False, 'message': "Please enter a single income amount, not a range.", 'help_text': "Example: 75000 or 75k"}
         except ValueError:
             return {'valid': False, 'message': "Please enter a valid income amount (numbers only).", 'help_text': "Examples: 75000, 75k, $75,000"}
+        
+        if income < 10000:
+            return {'valid': False, 'message': "That income seems too low for vehicle financing. Please enter your actual annual household income.", 'help_text': "Include all sources of income for your household."}
+        elif income > 1000000:
+            return {'valid': False, 'message': "That income seems unusually high. Please double-check and enter your actual annual household income.", 'help_text': "Enter your total household income before taxes."}
+        
+        return {'valid': True, 'processed_value': str(int(income))}
     
     def _validate_credit_score(self, response: str) -> Dict:
         """Validate credit score input"""
         try:
             score = int(response)
-            
-            if score < 300:
-                return {'valid': False, 'message': "Credit scores start at 300. Please enter a valid credit score.", 'help_text': "Credit scores range from 300 to 850."}
-            elif score > 850:
-                return {'valid': False, 'message': "Credit scores max out at 850. Please enter a valid credit score.", 'help_text': "Credit scores range from 300 to 850."}
-            elif score < 500:
-                return {'valid': False, 'message': f"A credit score of {score} is quite low. Are you sure this is correct?", 'help_text': "You can check your credit score for free at annualcreditreport.com"}
-            
-            return {'valid': True, 'processed_value': str(score)}
-            
         except ValueError:
             return {'valid': False, 'message': "Please enter a valid credit score (numbers only).", 'help_text': "Credit scores are typically between 300-850."}
+        
+        if score < 300:
+            return {'valid': False, 'message': "Credit scores start at 300. Please enter a valid credit score.", 'help_text': "Credit scores range from 300 to 850."}
+        elif score > 850:
+            return {'valid': False, 'message': "Credit scores max out at 850. Please enter a valid credit score.", 'help_text': "Credit scores range from 300 to 850."}
+        elif score < 500:
+            return {'valid': False, 'message': f"A credit score of {score} is quite low. Are you sure this is correct?", 'help_text': "You can check your credit score for free at annualcreditreport.com"}
+        
+        return {'valid': True, 'processed_value': str(score)}
     
     def _validate_housing_status(self, response: str) -> Dict:
         """Validate housing status input"""
-        valid_options = ['own', 'own_outright', 'rent', 'other']
-        response_lower = response.lower()
-        
-        # Check for exact matches
-        if response_lower in valid_options:
-            return {'valid': True, 'processed_value': response_lower}
-        
-        # Check for partial matches
-        if 'own' in response_lower and 'mortgage' in response_lower:
-            return {'valid': True, 'processed_value': 'own'}
-        elif 'own' in response_lower and ('outright' in response_lower or 'paid' in response_lower):
-            return {'valid': True, 'processed_value': 'own_outright'}
-        elif 'rent' in response_lower or 'renting' in response_lower:
-            return {'valid': True, 'processed_value': 'rent'}
-        
-        return {'valid': False, 'message': f"I don't recognize '{response}' as a housing status. Please choose from the options provided.", 'help_text': "Select: Own (with mortgage), Own outright, Rent, or Other"}
+        return validate_choice('housing_status', response)
     
     def _validate_employment_status(self, response: str) -> Dict:
         """Validate employment status input"""
-        valid_options = ['full-time', 'part-time', 'self-employed', 'contractor', 'unemployed', 'retired']
-        response_lower = response.lower()
-        
-        # Check for exact matches
-        if response_lower in valid_options:
-            return {'valid': True, 'processed_value': response_lower}
-        
-        # Check for partial matches
-        if 'full' in response_lower and 'time' in response_lower:
-            return {'valid': True, 'processed_value': 'full-time'}
-        elif 'part' in response_lower and 'time' in response_lower:
-            return {'valid': True, 'processed_value': 'part-time'}
-        elif 'self' in response_lower and 'employ' in response_lower:
-            return {'valid': True, 'processed_value': 'self-employed'}
-        elif 'contract' in response_lower or 'freelance' in response_lower:
-            return {'valid': True, 'processed_value': 'contractor'}
-        elif 'unemploy' in response_lower or 'jobless' in response_lower:
-            return {'valid': True, 'processed_value': 'unemployed'}
-        elif 'retire' in response_lower:
-            return {'valid': True, 'processed_value': 'retired'}
-        
-        return {'valid': False, 'message': f"I don't recognize '{response}' as an employment status. Please choose from the options provided.", 'help_text': "Select: Full-time Employee, Part-time Employee, Self-employed, Contractor, Unemployed, or Retired"}
+        return validate_choice('employment_status', response)
     
     def _validate_down_payment(self, response: str) -> Dict:
         """Validate down payment input"""
         try:
-            # Remove currency symbols and commas
-            cleaned = response.replace('$', '').replace(',', '').replace('k', '000').replace('K', '000')
-            amount = float(cleaned)
-            
-            if amount < 0:
-                return {'valid': False, 'message': "Down payment can't be negative. Please enter a positive amount.", 'help_text': "Enter 0 if you don't have a down payment."}
-            elif amount > 100000:
-                return {'valid': False, 'message': "That's a very large down payment. Please double-check the amount.", 'help_text': "Most down payments are between $0-$50,000."}
-            
-            return {'valid': True, 'processed_value': str(int(amount))}
-            
+            # Handles currency symbols, commas and 'k' amounts
+            amount = parse_amount(response)
         except ValueError:
             return {'valid': False, 'message': "Please enter a valid down payment amount (numbers only).", 'help_text': "Examples: 5000, $5,000, 5k"}
+        
+        if amount < 0:
+            return {'valid': False, 'message': "Down payment can't be negative. Please enter a positive amount.", 'help_text': "Enter 0 if you don't have a down payment."}
+        elif amount > 100000:
+            return {'valid': False, 'message': "That's a very large down payment. Please double-check the amount.", 'help_text': "Most down payments are between $0-$50,000."}
+        
+        return {'valid': True, 'processed_value': str(int(amount))}
     
     def _validate_loan_preference(self, response: str) -> Dict:
         """Validate loan preference input"""
-        valid_options = ['financing', 'lease', 'either']
-        response_lower = response.lower()
-        
-        # Check for exact matches
-        if response_lower in valid_options:
-            return {'valid': True, 'processed_value': response_lower}
-        
-        # Check for partial matches
-        if 'buy' in response_lower or 'purchase' in response_lower or 'finance' in response_lower:
-            return {'valid': True, 'processed_value': 'financing'}
-        elif 'lease' in response_lower or 'rent' in response_lower:
-            return {'valid': True, 'processed_value': 'lease'}
-        elif 'both' in response_lower or 'any' in response_lower or 'doesn\'t matter' in response_lower:
-            return {'valid': True, 'processed_value': 'either'}
-        
-        return {'valid': False, 'message': f"I don't recognize '{response}' as a loan preference. Please choose from the options provided.", 'help_text': "Select: Financing (Purchase), Leasing, or Either is fine"}
+        return validate_choice('loan_preference', response)
     
     def _validate_vehicle_preference(self, response: str) -> Dict:
         """Validate vehicle preference input"""
-        valid_options = ['sedan', 'suv', 'hybrid', 'truck', 'any']
-        response_lower = response.lower()
-        
-        # Check for exact matches
-        if response_lower in valid_options:
-            return {'valid': True, 'processed_value': response_lower}
-        
-        # Check for partial matches
-        if 'car' in response_lower or 'sedan' in response_lower:
-            return {'valid': True, 'processed_value': 'sedan'}
-        elif 'suv' in response_lower or 'sport' in response_lower:
-            return {'valid': True, 'processed_value': 'suv'}
-        elif 'hybrid' in response_lower or 'electric' in response_lower or 'ev' in response_lower:
-            return {'valid': True, 'processed_value': 'hybrid'}
-        elif 'truck' in response_lower or 'pickup' in response_lower:
-            return {'valid': True, 'processed_value': 'truck'}
-        elif 'any' in response_lower or 'doesn\'t matter' in response_lower or 'no preference' in response_lower:
-            return {'valid': True, 'processed_value': 'any'}
-        
-        return {'valid': False, 'message': f"I don't recognize '{response}' as a vehicle type. Please choose from the options provided.", 'help_text': "Select: Sedan, SUV, Hybrid/Electric, Truck, or Any type"}
+        return validate_choice('vehicle_preference', response)
+
+    # Single dispatch map from question key to its validator
+    _VALIDATORS = {
+        'income': _validate_income,
+        'credit_score': _validate_credit_score,
+        'housing_status': _validate_housing_status,
+        'employment_status': _validate_employment_status,
+        'down_payment': _validate_down_payment,
+        'loan_preference': _validate_loan_preference,
+        'vehicle_preference': _validate_vehicle_preference,
+    }
 
     def _get_next_question(self) -> Dict:
         """Get the next question in the flow"""
@@ -368,25 +489,140 @@ class FinancialAdvisorChatbot:
             'total_steps': len(self.conversation_state['question_flow'])
         }
 
-    def _generate_recommendations(self) -> Dict:
-        """Generate personalized recommendations using Gemini AI"""
-        try:
-            # Prepare context for Gemini
-            user_data = self.conversation_state['collected_data']
-            
-            print(f"🤖 Attempting to generate AI recommendations with user data: {user_data}")
-            
-            prompt = f"""
+    def _profile_key(self, session_id: Optional[str]) -> Tuple[Optional[str], str]:
+        """Coalescing key: the session plus a hash of everything the prompt depends on"""
+        profile = json.dumps({
+            'collected_data': self.conversation_state['collected_data'],
+            'vehicle_price': self.vehicle_price,
+            'vehicle_name': self.vehicle_name
+        }, sort_keys=True, default=str)
+        return session_id, hashlib.sha256(profile.encode('utf-8')).hexdigest()
+
+    def _maybe_speculate(self, session_id: Optional[str]):
+        """
+        Once only the final (select) question is left, start recommendations in
+        the background for its likeliest answers so the LLM call overlaps the
+        user's last click.
+        """
+        if _SPECULATOR is None or session_id is None or self.model is None:
+            return
+        flow = self.conversation_state['question_flow']
+        if self.conversation_state['current_step'] != len(flow) - 1:
+            return
+        final_key = flow[-1]
+        template = self.question_templates[final_key]
+        if template['type'] != 'select':
+            return
+        for choice in _SPECULATOR.predict([option['value'] for option in template['options']]):
+            # A finished copy of this conversation with the predicted answer filled in
+            clone = copy.copy(self)
+            clone.conversation_state = dict(
+                self.conversation_state,
+                collected_data=dict(self.conversation_state['collected_data'], **{final_key: choice}),
+                current_step=len(flow),
+                completed=True
+            )
+            if _SPECULATOR.start(session_id, clone._profile_key(session_id), clone._request_recommendations):
+                logger.info("speculating recommendations", choice=choice)
+
+    def _claim_speculation(self, session_id: Optional[str]):
+        """The background call started for exactly this profile, if the final answer was predicted"""
+        if _SPECULATOR is None or session_id is None:
+            return None
+        final_key = self.conversation_state['question_flow'][-1]
+        choice = self.conversation_state['collected_data'].get(final_key)
+        if choice is not None:
+            _SPECULATOR.record_choice(choice)
+        future = _SPECULATOR.claim(session_id, self._profile_key(session_id))
+        if future is None or future.cancelled():
+            return None
+        return future
+
+    def _generate_recommendations(self, session_id: Optional[str] = None) -> Dict:
+        """Generate recommendations, sharing one LLM call between identical concurrent requests"""
+        speculated = self._claim_speculation(session_id)
+        if speculated is not None:
+            return speculated.result()
+        response, shared = _RECOMMENDATION_FLIGHTS.do(self._profile_key(session_id), self._request_recommendations)
+        if shared:
+            metrics.inc('recommendation_coalesced_total')
+            return dict(response)
+        return response
+
+    async def _generate_recommendations_async(self, session_id: Optional[str] = None) -> Dict:
+        """Async counterpart of _generate_recommendations for requests served on an event loop"""
+        speculated = self._claim_speculation(session_id)
+        if speculated is not None:
+            return await asyncio.wrap_future(speculated)
+        response, shared = await _ASYNC_RECOMMENDATION_FLIGHTS.do(self._profile_key(session_id),
+                                                                  self._request_recommendations_async)
+        if shared:
+            metrics.inc('recommendation_coalesced_total')
+            return dict(response)
+        return response
+
+    def _request_recommendations(self) -> Dict:
+        """Generate personalized recommendations with the tier the profile routes to"""
+        user_data = self.conversation_state['collected_data']
+        route = _ROUTER.route(user_data, self.vehicle_price)
+        with metrics.timer('recommendation_route_seconds', tier=route.tier):
+            if route.tier == ROUTE_RULES:
+                return self._rules_response(user_data, route)
+            try:
+                logger.info("generating ai recommendations", answered_fields=sorted(user_data),
+                            tier=route.tier, complexity=route.score)
+                prompt = self._build_prompt(route.tier, user_data)
+                try:
+                    text = self.gateway.call(self._timed_generate_content, prompt, route.tier)
+                except LLMOverloaded as overloaded:
+                    return self._shed_response(user_data, overloaded)
+                return self._parse_recommendations(text, user_data, route.tier)
+            except Exception as e:
+                return self._tier_error_response(user_data, route, e)
+
+    async def _request_recommendations_async(self) -> Dict:
+        """Generate personalized recommendations without holding a thread while Gemini answers"""
+        user_data = self.conversation_state['collected_data']
+        route = _ROUTER.route(user_data, self.vehicle_price)
+        with metrics.timer('recommendation_route_seconds', tier=route.tier):
+            if route.tier == ROUTE_RULES:
+                return self._rules_response(user_data, route)
+            try:
+                logger.info("generating ai recommendations", answered_fields=sorted(user_data),
+                            tier=route.tier, complexity=route.score, mode='async')
+                prompt = self._build_prompt(route.tier, user_data)
+                try:
+                    text = await self.gateway.call_async(self._timed_generate_content_async, prompt, route.tier)
+                except LLMOverloaded as overloaded:
+                    return self._shed_response(user_data, overloaded)
+                return self._parse_recommendations(text, user_data, route.tier)
+            except Exception as e:
+                return self._tier_error_response(user_data, route, e)
+
+    def _tier_error_response(self, user_data: Dict, route: Route, error: Exception) -> Dict:
+        """Fall back to the rule engine, recording which tier failed so a broken model setup isn't hidden"""
+        logger.exception("recommendation tier failed", tier=route.tier, error=str(error))
+        metrics.inc('recommendation_tier_errors_total', tier=route.tier)
+        return self._error_response(user_data, error)
+
+    def _rules_response(self, user_data: Dict, route: Route) -> Dict:
+        """Answer a clear-cut profile straight from the rule engine"""
+        logger.info("answering profile with rules", complexity=route.score)
+        return self._recommendations_response(self._generate_personalized_fallback(user_data), user_data,
+                                              ROUTE_RULES)
+
+    def _build_prompt(self, tier: str, user_data: Dict) -> str:
+        if tier == ROUTE_FAST:
+            return self._build_compact_prompt(user_data)
+        return self._build_recommendation_prompt(user_data)
+
+    def _build_recommendation_prompt(self, user_data: Dict) -> str:
+        """Build the Gemini prompt for a completed financial profile"""
+        return f"""
             You are an expert Toyota Financial Services advisor with 15+ years of experience in automotive financing. You specialize in helping customers make optimal financial decisions for Toyota vehicle purchases and leases.
 
             CUSTOMER FINANCIAL PROFILE ANALYSIS:
-            - Annual Income: ${user_data.get('income', 'Not provided')}
-            - Credit Score: {user_data.get('credit_score', 'Not provided')}
-            - Housing Status: {user_data.get('housing_status', 'Not provided')}
-            - Employment Status: {user_data.get('employment_status', 'Not provided')}
-            - Down Payment Available: ${user_data.get('down_payment', 'Not provided')}
-            - Loan Preference: {user_data.get('loan_preference', 'Not provided')}
-            - Vehicle Preference: {user_data.get('vehicle_preference', 'Not provided')}
+            {self._profile_summary(user_data)}
 
             ANALYSIS FRAMEWORK - Apply these principles:
 
@@ -442,78 +678,102 @@ class FinancialAdvisorChatbot:
             6. RISK MITIGATION: Address any financial concerns or red flags
             7. TOYOTA-SPECIFIC ADVANTAGES: Leverage Toyota Financial Services benefits
 
-            Format your response as JSON with this structure:
-            {{
-                "recommendation": "Specific financing or leasing recommendation with brief reasoning",
-                "reasoning": "Detailed financial analysis explaining the recommendation based on debt-to-income, credit score, employment stability, and Toyota-specific factors",
-                "financial_analysis": {{
-                    "debt_to_income_ratio": "calculated percentage and assessment",
-                    "affordable_monthly_payment": "maximum recommended payment",
-                    "credit_tier": "excellent/good/fair/poor with implications",
-                    "risk_level": "low/medium/high with explanation"
-                }},
-                "tips": [
-                    "Specific, actionable tip 1",
-                    "Specific, actionable tip 2", 
-                    "Specific, actionable tip 3",
-                    "Toyota-specific tip or program"
-                ],
-                "suggested_terms": {{
-                    "loan_term": "specific term recommendation (e.g., '60 months for optimal rate vs payment balance')",
-                    "down_payment": "specific amount or percentage with reasoning",
-                    "financing_type": "financing or lease with detailed justification",
-                    "interest_rate_range": "expected rate range based on credit score"
-                }},
-                "concerns": [
-                    "Any financial red flags or areas needing attention"
-                ],
-                "next_steps": [
-                    "Immediate actionable step 1",
-                    "Immediate actionable step 2",
-                    "Toyota Financial Services specific action"
-                ],
-                "toyota_advantages": [
-                    "Specific Toyota Financial Services benefits for this customer"
-                ]
-            }}
+            {_RESPONSE_FORMAT}
 
             Focus on practical, actionable advice that maximizes the customer's financial position while leveraging Toyota's financing advantages.
             """
-            
-            response = self.model.generate_content(prompt)
-            
-            print(f"🤖 Gemini API response received: {len(response.text)} characters")
-            print(f"🤖 Response preview: {response.text[:200]}...")
-            
-            # Parse the JSON response
-            try:
-                recommendations = json.loads(response.text)
-                print("✅ Successfully parsed JSON response from Gemini AI")
-            except json.JSONDecodeError as json_error:
-                print(f"JSON parsing error: {json_error}")
-                print(f"Raw response: {response.text[:500]}...")
-                # Generate personalized fallback based on user data
-                recommendations = self._generate_personalized_fallback(user_data)
-            
-            return {
-                'type': 'recommendations',
-                'recommendations': recommendations,
-                'user_data': user_data,
-                'completed': True
-            }
-            
-        except Exception as e:
-            print(f"Error generating recommendations: {e}")
+
+    def _build_compact_prompt(self, user_data: Dict) -> str:
+        """Shorter prompt for borderline profiles on the fast model: the profile and the answer format only"""
+        return f"""
+            You are a Toyota Financial Services advisor. Recommend financing or leasing for this customer, with concise, specific reasoning, tips and next steps.
+
+            CUSTOMER FINANCIAL PROFILE:
+            {self._profile_summary(user_data)}
+
+            Use these credit tiers: Excellent (760+), Good (660-759), Fair (580-659), Poor (<580). Keep payments within 10-15% of monthly income.
+
+            {_RESPONSE_FORMAT}
+            """
+
+    @staticmethod
+    def _profile_summary(user_data: Dict) -> str:
+        """The answered profile as the bullet list both prompts start from"""
+        return f"""- Annual Income: ${user_data.get('income', 'Not provided')}
+            - Credit Score: {user_data.get('credit_score', 'Not provided')}
+            - Housing Status: {user_data.get('housing_status', 'Not provided')}
+            - Employment Status: {user_data.get('employment_status', 'Not provided')}
+            - Down Payment Available: ${user_data.get('down_payment', 'Not provided')}
+            - Loan Preference: {user_data.get('loan_preference', 'Not provided')}
+            - Vehicle Preference: {user_data.get('vehicle_preference', 'Not provided')}"""
+
+    def _parse_recommendations(self, text: str, user_data: Dict, tier: str) -> Dict:
+        """Parse the model's JSON answer, falling back to rule-based advice if it isn't JSON"""
+        logger.debug("gemini response received", characters=len(text))
+        
+        try:
+            with metrics.timer('recommendation_json_parse_seconds'):
+                recommendations = json.loads(text)
+        except json.JSONDecodeError as json_error:
+            logger.warning("gemini response is not valid json", error=str(json_error), raw_response=text[:500])
             # Generate personalized fallback based on user data
-            recommendations = self._generate_personalized_fallback(user_data)
-            return {
-                'type': 'recommendations',
-                'recommendations': recommendations,
-                'user_data': user_data,
-                'completed': True
-            }
+            return self._recommendations_response(self._timed_fallback(user_data, 'invalid_json'), user_data,
+                                                  'invalid_json')
+        
+        return self._recommendations_response(recommendations, user_data, tier)
+
+    def _shed_response(self, user_data: Dict, overloaded: LLMOverloaded) -> Dict:
+        """Shed straight to the rule engine rather than queueing behind the quota"""
+        logger.info("llm gateway shed request", reason=overloaded.reason)
+        return self._recommendations_response(self._timed_fallback(user_data, 'shed'), user_data, 'shed')
+
+    def _error_response(self, user_data: Dict, error: Exception) -> Dict:
+        """Answer with rule-based advice when the model call fails"""
+        logger.warning("recommendation generation failed", error=str(error))
+        return self._recommendations_response(self._timed_fallback(user_data, 'error'), user_data, 'error')
+
+    def _timed_generate_content(self, prompt: str, tier: str = None) -> str:
+        """Call Gemini once admitted by the gateway, timing only the model call itself"""
+        model = self.fast_model if tier == ROUTE_FAST else self.model
+        with metrics.timer('gemini_request_duration_seconds'):
+            return model.generate_content(prompt).text
+
+    async def _timed_generate_content_async(self, prompt: str, tier: str = None) -> str:
+        """Async Gemini call: the SDK's async client, or the REST stand-in for a custom endpoint"""
+        fast = tier == ROUTE_FAST
+        with metrics.timer('gemini_request_duration_seconds'):
+            if self.api_endpoint:
+                # The SDK's async client needs gRPC, which custom REST endpoints don't speak
+                if fast:
+                    return await generate_content_rest(self.api_endpoint, self.api_key, GEMINI_FAST_MODEL, prompt,
+                                                       FAST_GENERATION_CONFIG)
+                return await generate_content_rest(self.api_endpoint, self.api_key, GEMINI_MODEL, prompt)
+            response = await (self.fast_model if fast else self.model).generate_content_async(prompt)
+            return response.text
+
+    @staticmethod
+    def _recommendations_response(recommendations: Dict, user_data: Dict, source: str) -> Dict:
+        """
+        Wrap recommendations in the completed-conversation response shape. source is
+        the tier that answered (rules, fast, full) or why rule-based advice stood in
+        for the model (shed, error, invalid_json).
+        """
+        return {
+            'type': 'recommendations',
+            'recommendations': recommendations,
+            'user_data': user_data,
+            'source': source,
+            'completed': True
+        }
+
+    def _timed_fallback(self, user_data: Dict, reason: str) -> Dict:
+        """Build fallback recommendations while recording why and how long it took"""
+        metrics.inc('recommendation_fallback_total', reason=reason)
+        with metrics.timer('recommendation_fallback_seconds'):
+            return self._generate_personalized_fallback(user_data)
 
-    def _generate_personalized_fallback(self, user_data: Dict) -> Dict:
+    @staticmethod
+    def _generate_personalized_fallback(user_data: Dict) -> Dict:
         """Generate personalized recommendations based on user data when AI fails"""
         income = int(user_data.get('income', 75000))
         credit_score = int(user_data.get('credit_score', 700))
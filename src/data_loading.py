@@ -0,0 +1,58 @@
+"""
+CSV loaders for the vehicle and lender tables
+
+The iter_* functions stream rows one at a time so the SQLite import can load
+files larger than memory; the load_* functions return them as lists for the
+in-memory backend.
+"""
+
+import csv
+from typing import Dict, Iterator, List
+
+from .logging_service import get_logger
+
+logger = get_logger(__name__)
+
+
+def iter_vehicles_from_csv(file_path) -> Iterator[Dict]:
+    """Yields vehicles from the main CSV file, skipping rows without a price or year."""
+    try:
+        with open(file_path, mode='r', newline='', encoding='utf-8') as csvfile:
+            reader = csv.DictReader(csvfile)
+            for row in reader:
+                try:
+                    price = int(row.get('msrp_approx', 0))
+                    year = int(row.get('year', 0))
+                except ValueError:
+                    price = 0
+                    year = 0
+
+                if price > 0 and year > 0:
+                    yield {
+                        "year": year,
+                        "make": row.get('make', 'Toyota'),
+                        "model": row.get('model', 'Unknown'),
+                        "trim": row.get('trim', 'Base'),
+                        "price": price,
+                        "body_type": row.get('body_type'),
+                        "mpg_estimate": row.get('mpg_estimate'),
+                        "estimated_residual_36mo_percent": row.get('estimated_residual_36mo_percent')
+                    }
+    except FileNotFoundError:
+        logger.error("vehicle csv not found", path=file_path)
+
+def iter_financing_data(file_path) -> Iterator[Dict]:
+    """Yields lender rows from the financing and lease CSV file."""
+    try:
+        with open(file_path, mode='r', newline='', encoding='utf-8') as csvfile:
+            yield from csv.DictReader(csvfile)
+    except FileNotFoundError:
+        logger.error("finance csv not found", path=file_path)
+
+def load_vehicles_from_csv(file_path) -> List[Dict]:
+    """Loads vehicle data from the main CSV file."""
+    return list(iter_vehicles_from_csv(file_path))
+
+def load_financing_data(file_path) -> List[Dict]:
+    """Loads financing and lease options from the dedicated CSV file."""
+    return list(iter_financing_data(file_path))
@@ -0,0 +1,91 @@
+"""
+Minimal asyncio client for the Gemini generateContent REST call
+
+The SDK's async client only speaks gRPC, so when GEMINI_API_ENDPOINT points at
+a REST host (such as the local fake Gemini server) the async serving mode uses
+this instead. It sends one request per connection and needs no extra packages.
+"""
+
+import asyncio
+import json
+import os
+import ssl
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+REQUEST_TIMEOUT = float(os.environ.get('GEMINI_TIMEOUT', 60))
+
+
+class GeminiRESTError(Exception):
+    """Raised when the REST endpoint answers with an error status or an unusable body."""
+
+
+def _camel_case(key: str) -> str:
+    """SDK-style generation_config keys (max_output_tokens) as the REST API's camelCase."""
+    first, *rest = key.split('_')
+    return first + ''.join(word.title() for word in rest)
+
+
+async def _read_body(reader: asyncio.StreamReader, headers: dict) -> bytes:
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                await reader.readline()
+                return b''.join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+    if 'content-length' in headers:
+        return await reader.readexactly(int(headers['content-length']))
+    return await reader.read()
+
+
+async def _post_json(url: str, payload: dict, headers: dict) -> dict:
+    parts = urlsplit(url)
+    secure = parts.scheme == 'https'
+    port = parts.port or (443 if secure else 80)
+    body = json.dumps(payload).encode('utf-8')
+
+    reader, writer = await asyncio.open_connection(parts.hostname, port,
+                                                   ssl=ssl.create_default_context() if secure else None)
+    try:
+        path = parts.path + (f"?{parts.query}" if parts.query else '')
+        request_lines = [f"POST {path} HTTP/1.1", f"Host: {parts.netloc}", 'Content-Type: application/json',
+                         f"Content-Length: {len(body)}", 'Connection: close']
+        request_lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(('\r\n'.join(request_lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+        status = int((await reader.readline()).split()[1])
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        response_body = await _read_body(reader, response_headers)
+    finally:
+        writer.close()
+
+    if status >= 400:
+        raise GeminiRESTError(f"Gemini endpoint returned HTTP {status}: {response_body[:200]!r}")
+    return json.loads(response_body)
+
+
+async def generate_content_rest(api_endpoint: str, api_key: str, model: str, prompt: str,
+                                generation_config: Optional[Dict] = None) -> str:
+    """Sends one prompt to models/<model>:generateContent and returns the response text."""
+    base_url = api_endpoint if '://' in api_endpoint else f"https://{api_endpoint}"
+    url = f"{base_url.rstrip('/')}/v1beta/models/{model}:generateContent"
+    payload = {'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
+    if generation_config:
+        payload['generationConfig'] = {_camel_case(key): value for key, value in generation_config.items()}
+
+    document = await asyncio.wait_for(_post_json(url, payload, {'x-goog-api-key': api_key}), REQUEST_TIMEOUT)
+    try:
+        parts = document['candidates'][0]['content']['parts']
+    except (KeyError, IndexError) as e:
+        raise GeminiRESTError(f"Unexpected generateContent response: missing {e}") from e
+    return ''.join(part.get('text', '') for part in parts)
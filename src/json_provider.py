@@ -0,0 +1,84 @@
+"""
+Flask JSON provider backed by orjson when it's installed
+
+Produces the same documents as Flask's default provider (sorted keys, Flask's
+date/Decimal/UUID handling, non-ASCII text escaped as \\uXXXX) but encodes and
+parses in C. Without orjson, for values orjson can't encode (integers beyond 64
+bits), or when the output has non-ASCII text, it falls back to the
+standard-library provider. Large top-level arrays are streamed in chunks instead
+of being built into one string first.
+
+Where the orjson output still differs from Flask's:
+- NaN and Infinity become null. Flask writes bare NaN/Infinity tokens, which
+  are not valid JSON and which JSON.parse rejects.
+- Float formatting differs in places: 1e20 and 1e-7 rather than 1e+20 and
+  1e-07, and 0.00001 rather than 1e-05. The values are the same.
+- dumps() is compact, with no space after ',' or ':'. That matches Flask's
+  responses but not Flask's dumps().
+"""
+
+import os
+from typing import Any, Iterator
+
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # The standard-library encoder is used instead
+    orjson = None
+
+# Top-level arrays at least this long are sent as a chunked stream
+STREAM_MIN_ITEMS = int(os.environ.get('JSON_STREAM_MIN_ITEMS', 1000))
+STREAM_CHUNK_ITEMS = 500
+
+if orjson is not None:
+    # Datetimes go through Flask's default() so they keep its HTTP-date format
+    ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with orjson encoding/decoding and streamed large arrays."""
+
+    def _orjson_dumps(self, obj: Any) -> bytes:
+        """Compact JSON bytes, escaping non-ASCII text the way Flask does."""
+        body = orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS)
+        if not body.isascii():
+            # orjson has no ensure_ascii option; text that needs escaping is rare, so let the stdlib do it
+            return super().dumps(obj, separators=(',', ':')).encode('ascii')
+        return body
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        # Keyword arguments other than the default sort_keys (indent, separators...)
+        # ask for stdlib-specific formatting, so leave those to the parent
+        if orjson is None or kwargs.get('sort_keys', True) is not True or set(kwargs) - {'sort_keys'}:
+            return super().dumps(obj, **kwargs)
+        try:
+            return self._orjson_dumps(obj).decode('utf-8')
+        except orjson.JSONEncodeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def _iter_array(self, items: list) -> Iterator[bytes]:
+        yield b'['
+        for start in range(0, len(items), STREAM_CHUNK_ITEMS):
+            chunk = self._orjson_dumps(items[start:start + STREAM_CHUNK_ITEMS])[1:-1]
+            yield chunk if start == 0 else b',' + chunk
+        yield b']\n'
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        if orjson is None or self._app.debug:
+            # Debug mode pretty-prints, which only the stdlib encoder does
+            return super().response(obj)
+        if isinstance(obj, list) and len(obj) >= STREAM_MIN_ITEMS:
+            return self._app.response_class(self._iter_array(obj), mimetype=self.mimetype)
+        try:
+            body = self._orjson_dumps(obj) + b'\n'
+        except orjson.JSONEncodeError:
+            return super().response(obj)
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,221 @@
+"""
+Admission control and rate limiting for Gemini calls
+
+Every recommendation request passes through one process-wide gateway that
+caps concurrent calls, paces them with a token bucket matched to the API
+quota, and bounds how many callers may wait. Callers that cannot be admitted
+in time are shed immediately so they can fall back to rule-based advice.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from . import metrics
+
+T = TypeVar('T')
+
+
+class LLMOverloaded(Exception):
+    """Raised when a call is shed instead of being sent to the model."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"LLM gateway shed request: {reason}")
+        self.reason = reason
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Takes a token if one is available and returns 0, else returns seconds until one is."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def available(self) -> float:
+        """Tokens currently in the bucket, without taking any."""
+        with self._lock:
+            return min(self.capacity, self._tokens + (time.monotonic() - self._updated) * self.rate)
+
+    def acquire(self, deadline: float) -> bool:
+        """Blocks until a token is taken or the monotonic deadline passes."""
+        while True:
+            wait = self.try_acquire()
+            if wait == 0.0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class LLMGateway:
+    """
+    Concurrency semaphore + token bucket + bounded wait queue in front of the model.
+
+    At most `max_concurrency` calls run at once and calls start no faster than
+    `requests_per_minute`. Up to `max_queue` callers may wait (for at most
+    `queue_timeout` seconds) for a slot; anyone beyond that is shed at once.
+    """
+
+    def __init__(self, max_concurrency: int = 8, requests_per_minute: float = 60.0, burst: int = 10,
+                 max_queue: int = 32, queue_timeout: float = 5.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self._bucket = TokenBucket(requests_per_minute / 60.0, burst)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_flight = 0
+        self.shed_count = 0
+
+    @classmethod
+    def from_env(cls) -> 'LLMGateway':
+        """Builds a gateway from LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_BURST,
+        LLM_MAX_QUEUE and LLM_QUEUE_TIMEOUT."""
+        return cls(
+            max_concurrency=int(os.environ.get('LLM_MAX_CONCURRENCY', 8)),
+            requests_per_minute=float(os.environ.get('LLM_REQUESTS_PER_MINUTE', 60)),
+            burst=int(os.environ.get('LLM_BURST', 10)),
+            max_queue=int(os.environ.get('LLM_MAX_QUEUE', 32)),
+            queue_timeout=float(os.environ.get('LLM_QUEUE_TIMEOUT', 5)),
+        )
+
+    @classmethod
+    def unbounded(cls) -> 'LLMGateway':
+        """
+        A gateway that admits every call at once, for benchmarks and tests whose
+        models are stubbed and shouldn't be paced like the real API.
+        """
+        return cls(max_concurrency=1_000_000, requests_per_minute=1e12, burst=1_000_000_000,
+                   max_queue=1_000_000, queue_timeout=60.0)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def has_spare_capacity(self) -> bool:
+        """
+        True when nobody is waiting, at most half the slots are busy and at
+        least half the burst is left, so optional work won't delay real calls.
+        """
+        return (self._waiting == 0 and self._in_flight * 2 < self.max_concurrency
+                and self._bucket.available() * 2 >= self._bucket.capacity)
+
+    def _shed(self, reason: str):
+        with self._lock:
+            self.shed_count += 1
+        metrics.inc('llm_gateway_shed_total', reason=reason)
+        raise LLMOverloaded(reason)
+
+    def _enter_queue(self):
+        with self._lock:
+            queue_full = self._waiting >= self.max_queue
+            if not queue_full:
+                self._waiting += 1
+        if queue_full:
+            self._shed('queue_full')
+
+    def call(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Runs func(*args, **kwargs) once admitted, or raises LLMOverloaded."""
+        self._enter_queue()
+
+        wait_start = time.monotonic()
+        deadline = wait_start + self.queue_timeout
+        admitted = False
+        try:
+            if not self._slots.acquire(timeout=self.queue_timeout):
+                self._shed('concurrency_timeout')
+            admitted = True
+            if not self._bucket.acquire(deadline):
+                self._slots.release()
+                admitted = False
+                self._shed('rate_limited')
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        metrics.observe('llm_gateway_wait_seconds', time.monotonic() - wait_start)
+
+        with self._lock:
+            self._in_flight += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            if admitted:
+                self._slots.release()
+
+    async def call_async(self, func: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """
+        Awaits func(*args, **kwargs) once admitted, or raises LLMOverloaded.
+
+        Waiting callers park on the event loop rather than a thread. Async calls
+        share the queue bound, rate bucket and counters with call(), but draw
+        on their own max_concurrency slots since the two can't share a semaphore.
+        """
+        self._enter_queue()
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        slots = self._async_slots
+
+        wait_start = time.monotonic()
+        deadline = wait_start + self.queue_timeout
+        try:
+            try:
+                await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._shed('concurrency_timeout')
+            try:
+                wait = self._bucket.try_acquire()
+                while wait:
+                    if time.monotonic() + wait > deadline:
+                        self._shed('rate_limited')
+                    await asyncio.sleep(wait)
+                    wait = self._bucket.try_acquire()
+            except BaseException:
+                # Shed or cancelled while waiting for a token: give the slot back
+                slots.release()
+                raise
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        metrics.observe('llm_gateway_wait_seconds', time.monotonic() - wait_start)
+
+        with self._lock:
+            self._in_flight += 1
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            slots.release()
+
+
+
+GATEWAY = LLMGateway.from_env()
+
+metrics.gauge('llm_gateway_queue_depth', 'Callers waiting for an LLM slot or rate token.', lambda: GATEWAY.queue_depth)
+metrics.gauge('llm_gateway_in_flight', 'LLM calls currently running.', lambda: GATEWAY.in_flight)
+metrics.REGISTRY.describe('llm_gateway_shed_total', 'counter', 'LLM calls shed to the fallback, by reason.')
+metrics.REGISTRY.describe('llm_gateway_wait_seconds', 'histogram', 'Time callers waited for LLM admission.')
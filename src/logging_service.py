@@ -0,0 +1,163 @@
+"""
+Structured, non-blocking logging for the request paths
+
+Records are sampled and snapshotted on the calling thread, then redacted,
+formatted as JSON lines and written to stdout by a background listener thread.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+from . import metrics
+
+LOGGER_NAME = 'toyota'
+QUEUE_SIZE = 10000
+
+# Fields that carry customer financial data and must never reach the log stream verbatim
+REDACTED_FIELDS = frozenset({
+    'income', 'credit_score', 'down_payment', 'housing_status', 'employment_status',
+    'user_data', 'userData', 'responses', 'collected_data', 'chatbot_data', 'raw_response',
+    'response', 'user_response', 'prompt',
+})
+REDACTED = '[REDACTED]'
+
+metrics.REGISTRY.describe('log_records_dropped_total', 'counter', 'Log records dropped because the log queue was full.')
+
+
+def redact(value, key: Optional[str] = None):
+    """Returns a copy of value with sensitive keys masked, recursing into dicts and lists."""
+    if key in REDACTED_FIELDS:
+        return REDACTED
+    if isinstance(value, dict):
+        return {k: redact(v, k) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of records per level; WARNING and above are never sampled out."""
+
+    def __init__(self, rates: Dict[int, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, event and redacted fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(redact(fields))
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that defers formatting to the listener thread and drops
+    (and counts) records instead of blocking when the queue is full.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Snapshot mutable fields so later changes by the request thread don't leak in
+        fields = getattr(record, 'fields', None)
+        if fields:
+            record.fields = dict(fields)
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc('log_records_dropped_total')
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger adapter that turns keyword arguments into structured fields: log.info('event', key=value)."""
+
+    RESERVED = ('exc_info', 'stack_info', 'stacklevel', 'extra')
+
+    def process(self, msg, kwargs):
+        fields = {k: kwargs.pop(k) for k in list(kwargs) if k not in self.RESERVED}
+        if fields:
+            kwargs.setdefault('extra', {})['fields'] = fields
+        return msg, kwargs
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_configure_lock = threading.Lock()
+
+
+def _sample_rate(name: str, default: float) -> float:
+    try:
+        return max(0.0, min(1.0, float(os.environ.get(name, default))))
+    except ValueError:
+        return default
+
+def configure_logging():
+    """
+    Installs the queue-backed JSON handler on the application logger (idempotent).
+
+    LOG_LEVEL sets the threshold (default INFO). LOG_SAMPLE_DEBUG and
+    LOG_SAMPLE_INFO set the fraction of DEBUG/INFO records kept (defaults 0.1 and 1.0).
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JsonFormatter())
+
+        log_queue = queue.Queue(maxsize=QUEUE_SIZE)
+        queue_handler = NonBlockingQueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter({
+            logging.DEBUG: _sample_rate('LOG_SAMPLE_DEBUG', 0.1),
+            logging.INFO: _sample_rate('LOG_SAMPLE_INFO', 1.0),
+        }))
+
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+        logger.addHandler(queue_handler)
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """Flushes queued records and stops the background writer thread."""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+def get_logger(name: str) -> StructuredLogger:
+    """Returns a structured logger under the application namespace."""
+    return StructuredLogger(logging.getLogger(f"{LOGGER_NAME}.{name}"), {})
@@ -0,0 +1,184 @@
+"""
+Opt-in memory diagnostics for the admin endpoints
+
+Reports resident memory, object counts by type and the deep size of the app's
+large in-memory structures, and wraps tracemalloc so snapshots taken at two
+points can be diffed to find what grew. tracemalloc is off unless started with
+MEMORY_TRACEMALLOC=1 or through the admin endpoint, since tracing slows every
+allocation.
+"""
+
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from . import metrics
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Snapshots kept for diffing; the oldest is dropped first
+MAX_SNAPSHOTS = int(os.environ.get('MEMORY_MAX_SNAPSHOTS', 5))
+# Followed by nothing: code and module objects are shared, not owned by a structure
+_NOT_FOLLOWED = (type, types.ModuleType, types.FunctionType, types.MethodType, types.BuiltinFunctionType)
+# Deep sizing stops after this many objects so a huge structure can't stall a request
+MAX_SIZED_OBJECTS = 2_000_000
+
+
+def resident_memory_bytes() -> Optional[int]:
+    """Current RSS from /proc, or the peak RSS where /proc isn't available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    return None
+
+def deep_sizeof(obj: Any) -> Dict[str, int]:
+    """
+    Approximate retained size of obj and everything reachable through containers
+    and instance attributes. Shared objects are counted once; classes, modules
+    and functions are not followed.
+    """
+    seen = set()
+    stack = [obj]
+    size = 0
+    while stack and len(seen) < MAX_SIZED_OBJECTS:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _NOT_FOLLOWED):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        else:
+            if hasattr(current, '__dict__'):
+                stack.append(vars(current))
+            for slot in getattr(type(current), '__slots__', ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return {'bytes': size, 'objects': len(seen), 'truncated': bool(stack)}
+
+def object_counts(limit: int = 25) -> List[Dict]:
+    """Most common live object types tracked by the garbage collector."""
+    counts = Counter(type(obj).__name__ for obj in gc.get_objects())
+    return [{'type': name, 'count': count} for name, count in counts.most_common(limit)]
+
+
+class MemoryDiagnostics:
+    """Named structure sizes plus tracemalloc snapshots and diffs."""
+
+    def __init__(self, max_snapshots: int = MAX_SNAPSHOTS):
+        self.max_snapshots = max_snapshots
+        self._structures: Dict[str, Callable[[], Any]] = {}
+        self._snapshots: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+    def register(self, name: str, getter: Callable[[], Any]):
+        """Adds a structure to the size report; getter returns its current value."""
+        self._structures[name] = getter
+
+    def structure_sizes(self) -> Dict[str, Dict[str, int]]:
+        return {name: deep_sizeof(getter()) for name, getter in self._structures.items()}
+
+    def report(self, object_limit: int = 25) -> Dict:
+        tracing = tracemalloc.is_tracing()
+        traced, peak = tracemalloc.get_traced_memory() if tracing else (None, None)
+        return {
+            'resident_bytes': resident_memory_bytes(),
+            'gc_counts': gc.get_count(),
+            'tracemalloc': {'tracing': tracing, 'traced_bytes': traced, 'peak_bytes': peak,
+                            'snapshots': list(self._snapshots)},
+            'structures': self.structure_sizes(),
+            'object_counts': object_counts(object_limit),
+        }
+
+    # --- tracemalloc ---
+
+    @staticmethod
+    def start_tracing(frames: int = 1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop_tracing(self):
+        tracemalloc.stop()
+        with self._lock:
+            self._snapshots.clear()
+
+    def take_snapshot(self, limit: int = 20) -> Dict:
+        """Stores a snapshot for later diffs and returns its id with the top allocation sites."""
+        if not tracemalloc.is_tracing():
+            raise ValueError('tracemalloc is not tracing; start it first')
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        with self._lock:
+            snapshot_id = str(self._next_id)
+            self._next_id += 1
+            self._snapshots[snapshot_id] = {'snapshot': snapshot, 'taken': time.time()}
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        stats = snapshot.statistics('lineno')
+        return {
+            'id': snapshot_id,
+            'traced_bytes': sum(stat.size for stat in stats),
+            'top': [self._format_stat(stat) for stat in stats[:limit]],
+        }
+
+    def diff(self, base_id: str, target_id: Optional[str] = None, group_by: str = 'lineno', limit: int = 20) -> Dict:
+        """Largest allocation changes from snapshot base_id to target_id (a fresh snapshot if omitted)."""
+        if group_by not in ('lineno', 'filename', 'traceback'):
+            raise ValueError("group_by must be 'lineno', 'filename' or 'traceback'")
+        base = self._snapshots.get(base_id)
+        if base is None:
+            raise KeyError(base_id)
+        if target_id is None:
+            target_id = self.take_snapshot(limit=0)['id']
+        target = self._snapshots.get(target_id)
+        if target is None:
+            raise KeyError(target_id)
+        stats = target['snapshot'].compare_to(base['snapshot'], group_by)
+        return {
+            'base': base_id,
+            'target': target_id,
+            'seconds_between': round(target['taken'] - base['taken'], 3),
+            'size_diff_bytes': sum(stat.size_diff for stat in stats),
+            'top': [self._format_stat(stat) for stat in stats[:limit]],
+        }
+
+    @staticmethod
+    def _format_stat(stat) -> Dict:
+        entry = {
+            'location': [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+            'size_bytes': stat.size,
+            'count': stat.count,
+        }
+        if hasattr(stat, 'size_diff'):
+            entry['size_diff_bytes'] = stat.size_diff
+            entry['count_diff'] = stat.count_diff
+        return entry
+
+
+DIAGNOSTICS = MemoryDiagnostics()
+
+metrics.gauge('process_resident_memory_bytes', 'Resident set size of this process',
+              lambda: resident_memory_bytes() or 0)
+
+if os.environ.get('MEMORY_TRACEMALLOC') == '1':
+    MemoryDiagnostics.start_tracing(int(os.environ.get('MEMORY_TRACEMALLOC_FRAMES', 1)))
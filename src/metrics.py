@@ -0,0 +1,186 @@
+"""
+In-process metrics (counters and latency histograms) exposed in Prometheus text format
+"""
+
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STRIPE_COUNT = 16
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class _Stripe:
+    """One lock plus the counters and histograms written by the threads hashed to it."""
+
+    __slots__ = ('lock', 'counters', 'histograms')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[Tuple[str, LabelSet], float] = {}
+        self.histograms: Dict[Tuple[str, LabelSet], list] = {}
+
+
+class MetricsRegistry:
+    """
+    Thread-safe metrics registry.
+
+    Each thread is assigned one of STRIPE_COUNT stripes round-robin on its first
+    write, so concurrent request threads rarely contend on the same lock. (Thread
+    idents can't pick the stripe: pthread idents are page-aligned, so ident %
+    STRIPE_COUNT is the same for every thread.) Stripes are only merged
+    when the registry is scraped.
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._stripes = [_Stripe() for _ in range(STRIPE_COUNT)]
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._local = threading.local()
+        self._next_stripe = itertools.count()
+
+    def describe(self, name: str, metric_type: str, help_text: str):
+        """Registers a metric so it is exported (as zero) before its first sample."""
+        self._help[name] = (metric_type, help_text)
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]):
+        """Registers a gauge whose value is read from a callback at scrape time."""
+        self._help[name] = ('gauge', help_text)
+        self._gauges[name] = read
+
+    def _stripe(self) -> _Stripe:
+        stripe = getattr(self._local, 'stripe', None)
+        if stripe is None:
+            # count() is atomic under the GIL, so concurrent first writes still spread out
+            stripe = self._local.stripe = self._stripes[next(self._next_stripe) % STRIPE_COUNT]
+        return stripe
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """Increments a counter."""
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        stripe = self._stripe()
+        with stripe.lock:
+            stripe.counters[key] = stripe.counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        """Records one sample in a histogram."""
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        stripe = self._stripe()
+        with stripe.lock:
+            histogram = stripe.histograms.get(key)
+            if histogram is None:
+                # [bucket counts..., +Inf count, sum]
+                histogram = stripe.histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(self.buckets)] += 1
+            histogram[-1] += value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Context manager that observes the elapsed wall time of its block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Tuple[Dict, Dict]:
+        """Merges all stripes into (counters, histograms) dictionaries."""
+        counters: Dict[Tuple[str, LabelSet], float] = {}
+        histograms: Dict[Tuple[str, LabelSet], list] = {}
+        for stripe in self._stripes:
+            with stripe.lock:
+                stripe_counters = list(stripe.counters.items())
+                stripe_histograms = [(key, list(values)) for key, values in stripe.histograms.items()]
+            for key, value in stripe_counters:
+                counters[key] = counters.get(key, 0) + value
+            for key, values in stripe_histograms:
+                merged = histograms.get(key)
+                if merged is None:
+                    histograms[key] = values
+                else:
+                    histograms[key] = [a + b for a, b in zip(merged, values)]
+        return counters, histograms
+
+    def render_prometheus(self) -> str:
+        """Renders every metric in the Prometheus text exposition format."""
+        counters, histograms = self.snapshot()
+        by_name: Dict[str, list] = {}
+        for (name, labels), value in counters.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for (name, labels), values in histograms.items():
+            by_name.setdefault(name, []).append((labels, values))
+
+        lines = []
+        for name in sorted(set(by_name) | set(self._help)):
+            metric_type, help_text = self._help.get(name, ('untyped', ''))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if name in self._gauges:
+                lines.append(f"{name} {_format_float(self._gauges[name]())}")
+                continue
+            samples = by_name.get(name)
+            if not samples:
+                if metric_type == 'counter':
+                    lines.append(f"{name} 0")
+                continue
+            for labels, value in sorted(samples, key=lambda s: s[0]):
+                if isinstance(value, list):
+                    cumulative = 0
+                    for upper_bound, count in zip(self.buckets, value):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_float(upper_bound)),))} {cumulative}")
+                    cumulative += value[len(self.buckets)]
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {value[-1]:.6f}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_float(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _format_labels(labels: LabelSet) -> str:
+    if not labels:
+        return ''
+    escaped = (k + '="' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"' for k, v in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+# --- Default registry used by the app and chatbot service ---
+
+REGISTRY = MetricsRegistry()
+
+REGISTRY.describe('http_request_duration_seconds', 'histogram', 'Request latency by endpoint, method and status.')
+REGISTRY.describe('gemini_request_duration_seconds', 'histogram', 'Latency of Gemini generate_content calls.')
+REGISTRY.describe('recommendation_json_parse_seconds', 'histogram', 'Time spent parsing Gemini JSON responses.')
+REGISTRY.describe('recommendation_fallback_seconds', 'histogram', 'Time spent building rule-based fallback recommendations.')
+REGISTRY.describe('recommendation_fallback_total', 'counter', 'Recommendations served by the rule-based fallback, by reason.')
+REGISTRY.describe('template_render_seconds', 'histogram', 'Jinja template rendering time by template.')
+REGISTRY.describe('cache_hits_total', 'counter', 'Cache hits by cache name.')
+REGISTRY.describe('cache_misses_total', 'counter', 'Cache misses by cache name.')
+REGISTRY.describe('chatbot_sessions_started_total', 'counter', 'Chatbot conversations started.')
+REGISTRY.describe('chatbot_sessions_completed_total', 'counter', 'Chatbot conversations that reached recommendations.')
+REGISTRY.describe('chatbot_questionnaires_total', 'counter', 'One-shot questionnaire submissions by outcome.')
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+gauge = REGISTRY.gauge
+render_prometheus = REGISTRY.render_prometheus
+
+def record_cache(cache: str, hit: bool):
+    """Counts a cache lookup as a hit or miss for the named cache."""
+    REGISTRY.inc('cache_hits_total' if hit else 'cache_misses_total', cache=cache)
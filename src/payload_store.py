@@ -0,0 +1,96 @@
+"""
+Short-lived server-side store for page payloads
+
+The chatbot results and the user data passed between the financing, compare
+and payment pages used to travel as URL-encoded JSON in the query string,
+which made URLs long enough to hit proxy limits and had every page load
+re-parse them. Pages now save the payload once and navigate with a compact
+random token. Entries hold the parsed object and expire PAYLOAD_TTL seconds
+after they are saved. The endpoint that fills the store is unauthenticated, so
+the store is bounded by the total size of the saved JSON (PAYLOAD_STORE_MAX_BYTES,
+oldest evicted first) and each client address may only save
+PAYLOAD_SAVES_PER_MINUTE payloads.
+"""
+
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from . import metrics
+from .llm_gateway import TokenBucket
+
+PAYLOAD_TTL = float(os.environ.get('PAYLOAD_TTL', 1800))
+# Largest JSON body accepted by POST /api/payloads
+PAYLOAD_MAX_BYTES = int(os.environ.get('PAYLOAD_MAX_BYTES', 16 * 1024))
+# Total JSON bytes held by the store
+PAYLOAD_STORE_MAX_BYTES = int(os.environ.get('PAYLOAD_STORE_MAX_BYTES', 16 * 1024 * 1024))
+PAYLOAD_SAVES_PER_MINUTE = float(os.environ.get('PAYLOAD_SAVES_PER_MINUTE', 30))
+# Client addresses whose save rate is tracked; the least recently seen are forgotten beyond this
+_MAX_TRACKED_CLIENTS = 10000
+
+
+class PayloadStore:
+    """Token -> parsed payload, kept in save order so expired entries are always at the front."""
+
+    def __init__(self, ttl: float = PAYLOAD_TTL, max_bytes: int = PAYLOAD_STORE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size = 0
+        # token -> (payload, expires, size)
+        self._entries: 'OrderedDict[str, Tuple[Any, float, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, payload: Any, size: int) -> str:
+        """Stores an already-parsed payload of `size` JSON bytes and returns its token."""
+        token = secrets.token_urlsafe(12)
+        now = time.monotonic()
+        with self._lock:
+            while self._entries and (self.size + size > self.max_bytes
+                                     or next(iter(self._entries.values()))[1] < now):
+                self.size -= self._entries.popitem(last=False)[1][2]
+            self._entries[token] = (payload, now + self.ttl, size)
+            self.size += size
+        return token
+
+    def get(self, token: Optional[str]) -> Optional[Any]:
+        """The payload for token, or None if it is unknown or has expired."""
+        if not token:
+            return None
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._entries[token]
+                self.size -= entry[2]
+                entry = None
+        metrics.record_cache('payloads', entry is not None)
+        return entry[0] if entry is not None else None
+
+
+class SaveRateLimiter:
+    """One token bucket per client address, for the unauthenticated save endpoint."""
+
+    def __init__(self, per_minute: float = PAYLOAD_SAVES_PER_MINUTE, max_clients: int = _MAX_TRACKED_CLIENTS):
+        self.rate = per_minute / 60
+        # A page navigation saves a payload or two, so a client may save a third of its allowance at once
+        self.burst = max(per_minute / 3, 1)
+        self.max_clients = max_clients
+        self._buckets: 'OrderedDict[str, TokenBucket]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, client: str) -> float:
+        """0 if client may save now, else the seconds until it may."""
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+        return bucket.try_acquire()
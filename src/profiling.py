@@ -0,0 +1,116 @@
+"""
+Per-request profiling into a bounded on-disk ring buffer
+
+A request is profiled with cProfile when it carries X-Profile: 1 together with
+a valid admin token, or when it is picked by PROFILE_SAMPLE_RATE. Each profile
+is written as a pstats file plus a small JSON sidecar, and only the newest
+PROFILE_MAX_FILES are kept. With no token configured and a zero sample rate the
+per-request check is a single flag test.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'toyota-profiles'))
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 50))
+
+# Functions whose call trees are printed in profile summaries
+FOCUS_FUNCTIONS = ('get_financing_options', 'render_template', '_generate_recommendations')
+
+_PROFILE_ID = re.compile(r'^\d{13}-[0-9a-f]{8}$')
+
+
+class ProfileStore:
+    """Ring buffer of profile files in one directory, oldest evicted first."""
+
+    def __init__(self, directory: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES):
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def _ids(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.directory)
+                      if name.endswith('.prof') and _PROFILE_ID.match(name[:-5]))
+
+    def path(self, profile_id: str) -> Optional[str]:
+        """Path of a stored profile, or None for an unknown or malformed id."""
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, profile_id + '.prof')
+        return path if os.path.exists(path) else None
+
+    def save(self, profiler: cProfile.Profile, info: Dict) -> str:
+        """Writes a finished profile with its request info and evicts the oldest beyond max_files."""
+        profile_id = f"{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}"
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, profile_id)
+            profiler.dump_stats(base + '.prof')
+            with open(base + '.json', 'w', encoding='utf-8') as f:
+                json.dump(dict(info, id=profile_id), f)
+            for stale_id in self._ids()[:-self.max_files]:
+                for suffix in ('.prof', '.json'):
+                    try:
+                        os.remove(os.path.join(self.directory, stale_id + suffix))
+                    except FileNotFoundError:
+                        pass
+        return profile_id
+
+    def list(self) -> List[Dict]:
+        """Request info for every stored profile, newest first."""
+        profiles = []
+        for profile_id in reversed(self._ids()):
+            try:
+                with open(os.path.join(self.directory, profile_id + '.json'), encoding='utf-8') as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                profiles.append({'id': profile_id})
+        return profiles
+
+    def summary(self, profile_id: str, limit: int = 40) -> Optional[str]:
+        """Text report: top functions by cumulative time and the call trees under FOCUS_FUNCTIONS."""
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        stats = pstats.Stats(path, stream=out).strip_dirs().sort_stats('cumulative')
+        stats.print_stats(limit)
+        stats.print_callees(rf"\((?:{'|'.join(FOCUS_FUNCTIONS)})\)")
+        return out.getvalue()
+
+
+class RequestProfiler:
+    """Decides which requests to profile and records them into a ProfileStore."""
+
+    def __init__(self, store: ProfileStore, sample_rate: float = PROFILE_SAMPLE_RATE, token: Optional[str] = None):
+        self.store = store
+        self.sample_rate = sample_rate
+        # The only check made per request when profiling is off
+        self.enabled = sample_rate > 0 or bool(token)
+
+    def should_profile(self, forced: bool) -> bool:
+        """forced is an authorized X-Profile request; otherwise the sample rate decides."""
+        return forced or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    @staticmethod
+    def start() -> cProfile.Profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def finish(self, profiler: cProfile.Profile, info: Dict) -> str:
+        profiler.disable()
+        return self.store.save(profiler, info)
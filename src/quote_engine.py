@@ -0,0 +1,651 @@
+"""
+Quote engine helpers shared by the financing and affordability endpoints
+"""
+
+import bisect
+import heapq
+import itertools
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+from . import metrics
+from .logging_service import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_RATE = 99.0
+DEFAULT_TERMS = [60, 72]
+LEASE_MONTHLY_FACTOR = 0.01  # Simplified lease calculation (1% rule approximation)
+
+RATE_COLUMNS = (
+    'interest_rate_range_apy_excellent (760+)',
+    'interest_rate_range_apy_good (660-759)',
+    'interest_rate_range_apy_fair (580-659)',
+    'interest_rate_range_apy_poor (<580)',
+)
+
+US_STATES = frozenset({
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI', 'ID', 'IL', 'IN', 'IA', 'KS',
+    'KY', 'LA', 'ME', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM', 'NY', 'NC',
+    'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY',
+})
+
+LenderProduct = Tuple[str, float, float, List[int], List[str]]
+
+
+# --- Parsing Helpers ---
+
+def parse_rate_range(rate_string):
+    """
+    Parses a rate string (e.g., '1.99% - 4.99%') and returns a dict with min/max rates.
+    Defaults to 99.0 for max rate if parsing fails.
+    """
+    default_rate = DEFAULT_RATE
+    if not rate_string:
+        return {'min': default_rate, 'max': default_rate}
+
+    try:
+        # Remove percentage signs and trim whitespace
+        rate_string = rate_string.replace('%', '').strip()
+
+        if ' - ' in rate_string:
+            parts = [float(p.strip()) for p in rate_string.split(' - ') if p.strip()]
+            min_rate = parts[0] if parts else default_rate
+            max_rate = parts[-1] if len(parts) > 1 else min_rate
+        else:
+            # Handle single rate value (e.g., '13.49%')
+            min_rate = float(rate_string)
+            max_rate = min_rate
+
+        return {'min': min_rate, 'max': max_rate}
+    except ValueError:
+        return {'min': default_rate, 'max': default_rate}
+
+def get_rate_column_name(credit_score):
+    """Maps a credit score to the corresponding CSV column name for interest rate range."""
+    if credit_score >= 760:
+        return RATE_COLUMNS[0]
+    elif credit_score >= 660:
+        return RATE_COLUMNS[1]
+    elif credit_score >= 580:
+        return RATE_COLUMNS[2]
+    else:
+        return RATE_COLUMNS[3]
+
+def tier_name(rate_column: str) -> str:
+    """'interest_rate_range_apy_good (660-759)' -> 'good'"""
+    return rate_column.split('apy_', 1)[1].split(' ', 1)[0]
+
+def major_loan_type(loan_type):
+    """Returns 'financing' or 'lease' for a lender product description, or None if unknown."""
+    standardized_loan_type = loan_type.lower()
+    if 'loan' in standardized_loan_type:
+        return "financing"
+    elif 'lease' in standardized_loan_type:
+        return "lease"
+    return None
+
+def parse_coverage(country_coverage) -> Tuple[bool, Optional[FrozenSet[str]]]:
+    """
+    Parses a coverage string into (covers_us, us_states). us_states is None for
+    nationwide US coverage, e.g. 'US' or 'US, Canada', and the listed states for
+    regional coverage such as 'US (AL, FL, GA, NC, SC)'. Raises ValueError for US
+    coverage in any other form (e.g. 'US - CA only'), which could be regional.
+    """
+    coverage = (country_coverage or '').strip()
+    if coverage.startswith('US (') and ')' in coverage:
+        listed = [state.strip().upper() for state in coverage[4:coverage.index(')')].split(',')]
+        if not listed or not US_STATES.issuperset(listed):
+            raise ValueError(f"Unrecognized US states in coverage {coverage!r}")
+        return True, frozenset(listed)
+    regions = [region.strip() for region in coverage.split(',')]
+    if 'US' in regions:
+        return True, None
+    if any(region.upper().startswith('US') for region in regions):
+        raise ValueError(f"Unrecognized US coverage {coverage!r}")
+    return False, None
+
+def lender_coverage(lender: Dict) -> Tuple[bool, Optional[FrozenSet[str]]]:
+    """parse_coverage for a lender row; rows with unreadable coverage are logged and left out."""
+    try:
+        return parse_coverage(lender.get('country_coverage'))
+    except ValueError:
+        logger.warning("skipping lender with unrecognized coverage", lender=lender.get('lender_name'),
+                       coverage=lender.get('country_coverage'))
+        return False, None
+
+def parse_terms(terms_string) -> List[int]:
+    """Parses a typical_terms_months value such as '36, 48, 60' into month counts."""
+    try:
+        return [int(t.strip()) for t in (terms_string or '60, 72').split(',') if t.strip().isdigit()]
+    except ValueError:
+        return list(DEFAULT_TERMS)
+
+
+class LenderIndex:
+    """
+    US lender products parsed once at load time and indexed by credit tier and state.
+
+    Every row's coverage, rates, terms and loan types are parsed when the index is
+    built, so a quote only looks up its (tier, state) candidate list. Regional
+    lenders appear only under the states they cover, so without a state (or with
+    nationwide_only) only lenders covering every state are candidates;
+    any_region=True opts in to every US lender regardless of coverage.
+    """
+
+    def __init__(self, lenders: List[Dict]):
+        self.lender_count = len(lenders)
+        self._all: Dict[str, List[LenderProduct]] = {column: [] for column in RATE_COLUMNS}
+        self._nationwide: Dict[str, List[LenderProduct]] = {column: [] for column in RATE_COLUMNS}
+        self._by_state: Dict[str, Dict[str, List[LenderProduct]]] = {
+            column: {state: [] for state in US_STATES} for column in RATE_COLUMNS
+        }
+
+        for lender in lenders:
+            covers_us, states = lender_coverage(lender)
+            if not covers_us:
+                continue
+            lender_name = lender.get('lender_name', 'Unknown Lender').strip()
+            terms_months = parse_terms(lender.get('typical_terms_months'))
+            loan_types = [t.strip() for t in lender.get('loan_types_offered', '').split(',') if t.strip()]
+
+            for column in RATE_COLUMNS:
+                # Get the min/max rates for this credit score tier
+                rate_range = parse_rate_range(lender.get(column))
+                if rate_range['min'] >= DEFAULT_RATE:
+                    continue
+                product = (lender_name, rate_range['min'], rate_range['max'], terms_months, loan_types)
+                self._all[column].append(product)
+                if states is None:
+                    self._nationwide[column].append(product)
+                for state in (states if states is not None else US_STATES):
+                    self._by_state[column][state].append(product)
+
+    def products(self, rate_column, state: Optional[str] = None, nationwide_only: bool = False,
+                 any_region: bool = False) -> List[LenderProduct]:
+        """
+        (lender_name, rate_min, rate_max, terms_months, loan_types) for every lender
+        that publishes a rate for the tier column and covers the state (every US
+        state when there is none, or with nationwide_only), in file order.
+        any_region returns every US lender instead.
+        """
+        if nationwide_only or (state is None and not any_region):
+            return self._nationwide[rate_column]
+        if any_region:
+            return self._all[rate_column]
+        return self._by_state[rate_column].get(state, [])
+
+
+# --- Payment Math ---
+
+def annuity_factor(annual_rate, term) -> Tuple[float, float]:
+    """(numerator, denominator) of the annuity formula, so payment = principal * numerator / denominator."""
+    monthly_rate = annual_rate / 100 / 12
+    if monthly_rate > 0:
+        return monthly_rate * (1 + monthly_rate)**term, (1 + monthly_rate)**term - 1
+    # Handle zero interest rate
+    return 1, term
+
+def annuity_payment(principal, annual_rate, term):
+    """Monthly payment for a fully amortizing loan (standard annuity formula)."""
+    numerator, denominator = annuity_factor(annual_rate, term)
+    return principal * numerator / denominator
+
+def max_principal(monthly_payment, annual_rate, term):
+    """Inverse of annuity_payment: the largest principal a monthly payment can amortize."""
+    monthly_rate = annual_rate / 100 / 12
+    if monthly_rate > 0:
+        return monthly_payment * (1 - (1 + monthly_rate)**-term) / monthly_rate
+    return monthly_payment * term
+
+def lease_payment(vehicle_price, annual_rate):
+    """Monthly lease payment using the 1% rule approximation."""
+    monthly_rate = annual_rate / 100 / 12
+    return vehicle_price * LEASE_MONTHLY_FACTOR * (1 + monthly_rate)
+
+def max_lease_price(monthly_payment, annual_rate):
+    """Inverse of lease_payment: the most expensive vehicle a monthly payment can lease."""
+    monthly_rate = annual_rate / 100 / 12
+    return monthly_payment / (LEASE_MONTHLY_FACTOR * (1 + monthly_rate))
+
+
+# --- Financing Options ---
+
+def build_financing_options(lender_index: LenderIndex, credit_score, vehicle_price, down_payment, option_type=None,
+                            lender_filter=None, min_term=None, max_term=None, max_payment=None,
+                            state=None) -> List[Dict]:
+    """
+    Builds one grouped option per lender + term + rate range + major type.
+
+    Filters are applied before any payment math so excluded lenders, types and
+    terms cost nothing. Options are returned in build order; ranking is left to
+    the caller so it can pick a full sort or a partial selection.
+    """
+    loan_amount = vehicle_price - down_payment
+    rate_column = get_rate_column_name(credit_score)
+    lender_filter = lender_filter.lower() if lender_filter else None
+    # Use a dictionary to group options by a combination key
+    grouped_options = {}
+
+    for lender_name, interest_rate_min, interest_rate_max, terms_months, loan_types in lender_index.products(rate_column, state):
+        if lender_filter and lender_filter not in lender_name.lower():
+            continue
+
+        terms_months = [term for term in terms_months
+                        if (min_term is None or term >= min_term) and (max_term is None or term <= max_term)]
+
+        # --- Grouping Logic: Iterate over loan types and terms ---
+        for loan_type in loan_types:
+            # Determine the major option type (financing or lease)
+            # This is the primary separator
+            major_type = major_loan_type(loan_type)
+            if major_type is None or (option_type and major_type != option_type):
+                continue
+
+            for term in terms_months:
+                # The grouping key MUST include the major type (financing or lease)
+                # Key: Lender + Term + Min Rate + Max Rate + Major Type
+                group_key = f"{lender_name.lower()}-{term}-{interest_rate_min}-{interest_rate_max}-{major_type}"
+
+                if group_key not in grouped_options:
+                    # --- Initial Calculation for a new group ---
+                    if major_type == 'financing':
+                        # Payment calculation for a standard loan
+                        monthly_payment = annuity_payment(loan_amount, interest_rate_min, term)
+                        total_cost = monthly_payment * term + down_payment
+                    else:
+                        monthly_payment = lease_payment(vehicle_price, interest_rate_min)
+                        total_cost = monthly_payment * term  # Total lease payments
+
+                    if max_payment is not None and monthly_payment > max_payment:
+                        grouped_options[group_key] = None
+                        continue
+
+                    # --- Create the initial grouped option ---
+                    grouped_options[group_key] = {
+                        "key": group_key,
+                        "bank": lender_name,
+                        "rate_min": interest_rate_min,
+                        "rate_max": interest_rate_max,
+                        "term": term,
+                        "type": major_type,
+                        # Store all individual term descriptions to be joined later
+                        "term_descriptions_list": set(),
+                        "monthly_payment": round(monthly_payment, 2),
+                        "total_cost": round(total_cost, 2),
+                    }
+
+                # --- Aggregation Step ---
+                # Add the specific product description to the set for this group
+                if grouped_options[group_key] is not None:
+                    grouped_options[group_key]["term_descriptions_list"].add(loan_type.strip())
+
+    # --- Final Formatting and Cleanup ---
+    final_options = []
+    for option in grouped_options.values():
+        if option is None:
+            continue
+        # Join the descriptions into a single string for display (e.g., 'New Auto Loan, Used Auto Loan')
+        option['term_description'] = ", ".join(sorted(option.pop("term_descriptions_list")))
+        final_options.append(option)
+
+    return final_options
+
+def option_rank_key(option) -> Tuple[float, int, str]:
+    """Best-first ordering: monthly payment, then term, then group key as a tiebreak."""
+    return (option['monthly_payment'], option['term'], option['key'])
+
+def select_options(options: List[Dict], limit: int, after: Optional[Tuple] = None) -> Tuple[List[Dict], bool]:
+    """
+    Returns the `limit` best options ranked after the `after` rank key, plus whether
+    more remain. Uses a heap-based partial selection instead of sorting everything.
+    """
+    if after is not None:
+        after = tuple(after)
+        options = [option for option in options if option_rank_key(option) > after]
+    page = heapq.nsmallest(limit + 1, options, key=option_rank_key)
+    return page[:limit], len(page) > limit
+
+
+# --- Option Comparison ---
+
+def compare_options(options: List[Dict], vehicle_price, down_payment) -> Dict:
+    """
+    Aligns the given options against the first one (the baseline): monthly
+    payment and total cost deltas, cumulative interest and cumulative paid per
+    month, and the break-even month where an option that cost more to date
+    becomes the cheaper one (or the reverse).
+
+    Vectorized as [option, month] NumPy arrays: a financing option's interest
+    each month is its closed-form amortized balance times the monthly rate, a
+    lease's is the rent charge above the 1% rule's base payment.
+    """
+    horizon = max(option['term'] for option in options)
+    loan_amount = vehicle_price - down_payment
+    financing = np.array([option['type'] == 'financing' for option in options])
+    terms = np.array([option['term'] for option in options])
+    monthly_rate = np.array([option['rate_min'] for option in options], dtype=float) / 100 / 12
+    payment = np.array([annuity_payment(loan_amount, option['rate_min'], option['term'])
+                        if option['type'] == 'financing' else lease_payment(vehicle_price, option['rate_min'])
+                        for option in options])
+    months = np.arange(1, horizon + 1)
+    active = months[None, :] <= terms[:, None]
+
+    # Balance owed before each month's payment; at a zero rate the charge is zero whatever it is
+    growth = (1 + monthly_rate[:, None]) ** (months[None, :] - 1)
+    safe_rate = np.where(monthly_rate > 0, monthly_rate, 1)[:, None]
+    balance = loan_amount * growth - payment[:, None] * (growth - 1) / safe_rate
+    lease_charge = vehicle_price * LEASE_MONTHLY_FACTOR * monthly_rate
+    charge = np.where(financing[:, None], balance * monthly_rate[:, None], lease_charge[:, None])
+    interest = np.cumsum(np.where(active, charge, 0.0), axis=1)
+
+    payments = np.where(active, payment[:, None], 0.0)
+    payments[:, 0] += np.where(financing, down_payment, 0.0)
+    paid = np.cumsum(payments, axis=1)
+
+    # Differences under half a cent count as even
+    difference = paid - paid[0]
+    signs = np.where(np.abs(difference) < 0.005, 0, np.sign(difference))
+    break_even = [None] * len(options)
+    for i in range(1, len(options)):
+        decided = np.flatnonzero(signs[i])
+        if decided.size:
+            flips = np.flatnonzero(signs[i, decided[0] + 1:] != signs[i, decided[0]])
+            if flips.size:
+                break_even[i] = int(months[decided[0] + 1 + flips[0]])
+
+    # Python's round, not np.round: the latter's scale-and-rint drifts by a cent on some halves
+    interest_curves = [[round(value, 2) for value in row] for row in interest.tolist()]
+    paid_curves = [[round(value, 2) for value in row] for row in paid.tolist()]
+
+    baseline = options[0]
+    comparisons = []
+    for i, option in enumerate(options):
+        comparisons.append({
+            "key": option['key'],
+            "bank": option['bank'],
+            "type": option['type'],
+            "term": option['term'],
+            "rate_min": option['rate_min'],
+            "monthly_payment": option['monthly_payment'],
+            "total_cost": option['total_cost'],
+            "total_interest": interest_curves[i][-1],
+            "monthly_payment_delta": round(option['monthly_payment'] - baseline['monthly_payment'], 2),
+            "total_cost_delta": round(option['total_cost'] - baseline['total_cost'], 2),
+            "break_even_month": break_even[i],
+            "cumulative_interest": interest_curves[i],
+            "cumulative_paid": paid_curves[i],
+        })
+
+    return {
+        "baseline": baseline['key'],
+        "horizon_months": horizon,
+        "comparisons": comparisons,
+    }
+
+
+# --- Precomputed Best Offers ---
+
+class BestOfferTable:
+    """
+    Cheapest financing and lease product per credit tier and state.
+
+    For a given vehicle and down payment every financing payment is the principal
+    times the product's annuity factor, and every lease payment is the price times
+    its lease factor, so the best offer for any vehicle is simply the product with
+    the smallest factor. Factors are computed once per (tier, state) and reused
+    for every quote.
+    """
+
+    def __init__(self, lender_index: LenderIndex, min_term=None, max_term=None):
+        self.lender_index = lender_index
+        self.min_term = min_term
+        self.max_term = max_term
+        self._best: Dict[Tuple[str, Optional[str], bool], Dict[str, Optional[Dict]]] = {}
+
+    def best_products(self, rate_column, state=None, nationwide_only=False) -> Dict[str, Optional[Dict]]:
+        """{'financing': product, 'lease': product} with the smallest payment factors (None if no offer)."""
+        cache_key = (rate_column, state, nationwide_only)
+        best = self._best.get(cache_key)
+        metrics.record_cache('best_offers', best is not None)
+        if best is not None:
+            return best
+
+        candidates = {'financing': [], 'lease': []}
+        for lender_name, rate_min, rate_max, terms_months, loan_types in self.lender_index.products(rate_column, state, nationwide_only):
+            major_types = {major_loan_type(loan_type) for loan_type in loan_types} - {None}
+            for term in terms_months:
+                if (self.min_term is not None and term < self.min_term) or (self.max_term is not None and term > self.max_term):
+                    continue
+                for major_type in major_types:
+                    if major_type == 'financing':
+                        numerator, denominator = annuity_factor(rate_min, term)
+                    else:
+                        numerator, denominator = 1 + rate_min / 100 / 12, 1
+                    factor = numerator / denominator
+                    key = f"{lender_name.lower()}-{term}-{rate_min}-{rate_max}-{major_type}"
+                    candidates[major_type].append((factor, term, key, {
+                        "key": key,
+                        "bank": lender_name,
+                        "rate_min": rate_min,
+                        "rate_max": rate_max,
+                        "term": term,
+                        "type": major_type,
+                        "factor": factor,
+                        # Kept separately so payments round exactly like annuity_payment / lease_payment
+                        "numerator": numerator,
+                        "denominator": denominator,
+                    }))
+
+        best = {major_type: (min(products)[3] if products else None) for major_type, products in candidates.items()}
+        self._best[cache_key] = best
+        return best
+
+    def quote(self, rate_column, vehicle_price, down_payment, state=None, nationwide_only=False) -> Dict[str, Optional[Dict]]:
+        """Best financing and lease quote for one vehicle price, in build_financing_options' units."""
+        quotes = {}
+        for major_type, product in self.best_products(rate_column, state, nationwide_only).items():
+            if product is None:
+                quotes[major_type] = None
+                continue
+            if major_type == 'financing':
+                monthly_payment = max(vehicle_price - down_payment, 0) * product['numerator'] / product['denominator']
+                total_cost = monthly_payment * product['term'] + min(down_payment, vehicle_price)
+            else:
+                monthly_payment = vehicle_price * LEASE_MONTHLY_FACTOR * product['numerator']
+                total_cost = monthly_payment * product['term']
+            quotes[major_type] = {
+                "key": product['key'],
+                "bank": product['bank'],
+                "rate_min": product['rate_min'],
+                "term": product['term'],
+                "monthly_payment": round(monthly_payment, 2),
+                "total_cost": round(total_cost, 2),
+            }
+        return quotes
+
+
+class PaymentBadgeView:
+    """
+    Materialized best financing and lease payment for every vehicle and credit
+    tier at the default 10% down payment, so the catalog can show payments
+    without quoting per page view. The visitor's state isn't known, so only
+    nationwide lenders are quoted.
+
+    Rows are keyed by the vehicle's identity and price. A vehicle refresh only
+    computes rows that are new or repriced, and a lender refresh only the tiers
+    whose best products changed. Each refresh swaps in a new dict, so readers
+    never see a half-updated view.
+    """
+
+    DOWN_PAYMENT_RATE = 0.1
+
+    def __init__(self, vehicles: List[Dict], best_offers: BestOfferTable):
+        self._best_offers = best_offers
+        self._tier_products = {rate_column: self._product_keys(best_offers, rate_column) for rate_column in RATE_COLUMNS}
+        self._rows: Dict[Tuple, Dict[str, Dict]] = {}
+        self.refresh_vehicles(vehicles)
+
+    @staticmethod
+    def vehicle_key(vehicle: Dict) -> Tuple:
+        return (vehicle['year'], vehicle['make'], vehicle['model'], vehicle['trim'], vehicle['price'])
+
+    @staticmethod
+    def _product_keys(best_offers: BestOfferTable, rate_column) -> Tuple:
+        return tuple(product and product['key'] for product in best_offers.best_products(rate_column, nationwide_only=True).values())
+
+    def _tier_badge(self, rate_column, price) -> Dict[str, Optional[Dict]]:
+        quotes = self._best_offers.quote(rate_column, price, price * self.DOWN_PAYMENT_RATE, nationwide_only=True)
+        return {major_type: quote and {'monthly_payment': quote['monthly_payment'], 'term': quote['term'], 'bank': quote['bank']}
+                for major_type, quote in quotes.items()}
+
+    def refresh_vehicles(self, vehicles: List[Dict]) -> int:
+        """Rebuilds the view for a new vehicle table; returns the number of rows computed."""
+        rows = {}
+        computed = 0
+        for vehicle in vehicles:
+            key = self.vehicle_key(vehicle)
+            if key in rows:
+                continue
+            row = self._rows.get(key)
+            if row is None:
+                row = {tier_name(rate_column): self._tier_badge(rate_column, vehicle['price']) for rate_column in RATE_COLUMNS}
+                computed += 1
+            rows[key] = row
+        self._rows = rows
+        return computed
+
+    def refresh_lenders(self, best_offers: BestOfferTable) -> List[str]:
+        """Switches to a new lender table, recomputing only tiers whose best offers changed; returns those tiers."""
+        self._best_offers = best_offers
+        changed = []
+        for rate_column in RATE_COLUMNS:
+            product_keys = self._product_keys(best_offers, rate_column)
+            if product_keys != self._tier_products[rate_column]:
+                self._tier_products[rate_column] = product_keys
+                changed.append(rate_column)
+        if changed:
+            rows = {}
+            for key, row in self._rows.items():
+                row = dict(row)
+                for rate_column in changed:
+                    row[tier_name(rate_column)] = self._tier_badge(rate_column, key[-1])
+                rows[key] = row
+            self._rows = rows
+        return [tier_name(rate_column) for rate_column in changed]
+
+    def badges(self, vehicles: List[Dict]) -> List[Optional[Dict[str, Dict]]]:
+        """Per-tier badges aligned with vehicles (None for a vehicle the view hasn't seen)."""
+        rows = self._rows
+        return [rows.get(self.vehicle_key(vehicle)) for vehicle in vehicles]
+
+
+# --- Affordability Solver ---
+
+class VehiclePriceIndex:
+    """Vehicles sorted by price so affordability checks are binary-search range queries."""
+
+    def __init__(self, vehicles: List[Dict]):
+        self.vehicles = sorted(vehicles, key=lambda v: v['price'])
+        self.prices = [v['price'] for v in self.vehicles]
+
+    def __len__(self):
+        return len(self.vehicles)
+
+    def count_up_to(self, max_price) -> int:
+        """Number of vehicles priced at or below max_price."""
+        return bisect.bisect_right(self.prices, max_price)
+
+    def up_to(self, max_price, limit: Optional[int] = None) -> List[Dict]:
+        """Cheapest-first vehicles priced at or below max_price, optionally capped at limit."""
+        end = self.count_up_to(max_price)
+        if limit is not None:
+            end = min(end, limit)
+        return self.vehicles[:end]
+
+    def find(self, year=None, body_type=None, max_price=None, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """Cheapest-first vehicles matching every given filter, paged by limit/offset."""
+        candidates = self.vehicles if max_price is None else self.up_to(max_price)
+        matches = (vehicle for vehicle in candidates
+                   if (year is None or vehicle['year'] == year)
+                   and (body_type is None or (vehicle['body_type'] or '').lower() == body_type.lower()))
+        return list(itertools.islice(matches, offset, None if limit is None else offset + limit))
+
+def solve_affordability(index: VehiclePriceIndex, lender_index: LenderIndex, monthly_budget, credit_score=700,
+                        down_payment=0, option_type=None, limit=10, state=None) -> Dict:
+    """
+    Finds the cheapest vehicle x lender x term combinations whose monthly payment
+    fits within monthly_budget.
+
+    For every (lender, term, tier rate) the annuity formula is inverted to get the
+    highest vehicle price the budget can carry, then the price index answers the
+    range query. Total cost grows with price for a fixed product, so only the first
+    `limit` vehicles of each range can make the overall top-k, which is kept in a heap.
+    """
+    rate_column = get_rate_column_name(credit_score)
+    price_ceilings = {}
+    total_matches = 0
+    heap = []  # max-heap on total cost via negated keys, bounded at `limit`
+    tiebreak = itertools.count()
+
+    for lender_name, rate_min, rate_max, terms_months, loan_types in lender_index.products(rate_column, state):
+        major_types = {major_loan_type(loan_type) for loan_type in loan_types} - {None}
+        if option_type:
+            major_types &= {option_type}
+
+        for major_type in sorted(major_types):
+            for term in terms_months:
+                if major_type == 'financing':
+                    max_price = max_principal(monthly_budget, rate_min, term) + down_payment
+                else:
+                    max_price = max_lease_price(monthly_budget, rate_min)
+
+                ceiling_key = f"{lender_name.lower()}-{term}-{rate_min}-{rate_max}-{major_type}"
+                price_ceilings[ceiling_key] = {
+                    "bank": lender_name,
+                    "term": term,
+                    "type": major_type,
+                    "rate_min": rate_min,
+                    "max_vehicle_price": round(max_price, 2),
+                }
+
+                total_matches += index.count_up_to(max_price)
+                for vehicle in index.up_to(max_price, limit):
+                    if major_type == 'financing':
+                        loan_amount = max(vehicle['price'] - down_payment, 0)
+                        monthly_payment = annuity_payment(loan_amount, rate_min, term)
+                        total_cost = monthly_payment * term + min(down_payment, vehicle['price'])
+                    else:
+                        monthly_payment = lease_payment(vehicle['price'], rate_min)
+                        total_cost = monthly_payment * term
+
+                    entry = (-total_cost, -monthly_payment, ceiling_key, next(tiebreak), vehicle)
+                    if len(heap) < limit:
+                        heapq.heappush(heap, entry)
+                    elif entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+                    else:
+                        # Later vehicles in this range only cost more
+                        break
+
+    matches = []
+    for neg_total_cost, neg_monthly_payment, ceiling_key, _, vehicle in sorted(heap, reverse=True):
+        ceiling = price_ceilings[ceiling_key]
+        matches.append({
+            "vehicle": vehicle,
+            "bank": ceiling["bank"],
+            "term": ceiling["term"],
+            "type": ceiling["type"],
+            "rate_min": ceiling["rate_min"],
+            "monthly_payment": round(-neg_monthly_payment, 2),
+            "total_cost": round(-neg_total_cost, 2),
+        })
+
+    return {
+        "monthly_budget": round(monthly_budget, 2),
+        "credit_score": credit_score,
+        "total_matches": total_matches,
+        "price_ceilings": sorted(price_ceilings.values(), key=lambda c: -c["max_vehicle_price"]),
+        "matches": matches,
+    }
@@ -0,0 +1,122 @@
+"""
+Complexity-based routing of completed profiles
+
+Clear-cut profiles (strong credit, stable employment, a solid down payment and
+a plain financing preference) get nothing from the LLM that the rule engine
+doesn't already say, so they are answered instantly by it. Borderline profiles
+go to a faster model with a compact prompt and only complex ones get the full
+analysis prompt. Each profile is scored by adding points for every risk or
+ambiguity factor; the thresholds between tiers are configurable.
+"""
+
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from . import metrics
+
+ROUTE_RULES = 'rules'
+ROUTE_FAST = 'fast'
+ROUTE_FULL = 'full'
+
+# Employment answers that make income verification or stability a question
+_IRREGULAR_EMPLOYMENT = ('part-time', 'self-employed', 'contractor')
+# Share of monthly income a payment may take before affordability needs discussing
+_AFFORDABLE_PAYMENT_SHARE = 0.15
+# Loan term used to estimate the monthly payment for the affordability check
+_ESTIMATE_TERM_MONTHS = 60
+
+metrics.REGISTRY.describe('recommendation_route_total', 'counter', 'Completed profiles by routing tier (rules, fast, full).')
+metrics.REGISTRY.describe('recommendation_route_seconds', 'histogram', 'Time to answer a completed profile, by routing tier.')
+metrics.REGISTRY.describe('recommendation_tier_errors_total', 'counter',
+                          'Model tiers that failed and fell back to the rule engine, by tier.')
+
+
+class Route(NamedTuple):
+    tier: str
+    score: int
+    factors: List[str]
+
+
+def _number(value, default: float) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+def score_profile(user_data: Dict, vehicle_price=None) -> Tuple[int, List[str]]:
+    """Complexity points for a profile and the factors that contributed them."""
+    income = _number(user_data.get('income'), 0)
+    credit_score = _number(user_data.get('credit_score'), 0)
+    down_payment = _number(user_data.get('down_payment'), 0)
+    price = _number(vehicle_price, 0)
+    factors = []
+
+    def add(points: int, factor: str):
+        factors.extend([factor] * points)
+
+    if credit_score < 620:
+        add(3, 'subprime_credit')
+    elif credit_score < 680:
+        add(2, 'fair_credit')
+    elif credit_score < 740:
+        add(1, 'good_credit')
+
+    employment = user_data.get('employment_status')
+    if employment == 'unemployed':
+        add(3, 'unemployed')
+    elif employment in _IRREGULAR_EMPLOYMENT:
+        add(1, 'irregular_income')
+
+    if income < 40000:
+        add(2, 'low_income')
+
+    # Down payment against the vehicle when one was chosen, otherwise against income
+    if price > 0:
+        down_share = down_payment / price
+        if down_share < 0.1:
+            add(2, 'small_down_payment')
+        elif down_share < 0.2:
+            add(1, 'moderate_down_payment')
+        monthly_payment = max(price - down_payment, 0) / _ESTIMATE_TERM_MONTHS
+        if income and monthly_payment > income / 12 * _AFFORDABLE_PAYMENT_SHARE:
+            add(2, 'payment_over_budget')
+    elif income and down_payment < income * 0.1:
+        add(1, 'small_down_payment')
+
+    if user_data.get('loan_preference') != 'financing':
+        add(1, 'lease_or_undecided')
+    if user_data.get('housing_status') == 'other':
+        add(1, 'housing_other')
+
+    return len(factors), sorted(set(factors), key=factors.index)
+
+
+class RecommendationRouter:
+    """Picks the rules, fast or full tier from a profile's complexity score."""
+
+    def __init__(self, rules_max_score: int = 0, fast_max_score: int = 3, enabled: bool = True):
+        self.rules_max_score = rules_max_score
+        self.fast_max_score = fast_max_score
+        self.enabled = enabled
+
+    @classmethod
+    def from_env(cls) -> 'RecommendationRouter':
+        """Thresholds from ROUTING_RULES_MAX_SCORE and ROUTING_FAST_MAX_SCORE; RECOMMENDATION_ROUTING=0 sends everything to the full tier."""
+        return cls(
+            rules_max_score=int(os.environ.get('ROUTING_RULES_MAX_SCORE', 0)),
+            fast_max_score=int(os.environ.get('ROUTING_FAST_MAX_SCORE', 3)),
+            enabled=os.environ.get('RECOMMENDATION_ROUTING', '1') != '0',
+        )
+
+    def route(self, user_data: Dict, vehicle_price: Optional[float] = None) -> Route:
+        score, factors = score_profile(user_data, vehicle_price)
+        if not self.enabled:
+            tier = ROUTE_FULL
+        elif score <= self.rules_max_score:
+            tier = ROUTE_RULES
+        elif score <= self.fast_max_score:
+            tier = ROUTE_FAST
+        else:
+            tier = ROUTE_FULL
+        metrics.inc('recommendation_route_total', tier=tier)
+        return Route(tier, score, factors)
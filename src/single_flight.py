@@ -0,0 +1,85 @@
+"""
+Request coalescing for duplicate in-flight work
+
+The first caller for a key runs the work; callers that arrive with the same
+key while it is still running wait for that result instead of repeating it.
+Nothing is cached once the call finishes.
+"""
+
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar('T')
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread-safe group of in-flight calls keyed by any hashable value."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def do(self, key: Hashable, func: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        Runs func() unless a call for key is already running, in which case it
+        waits for that call. Returns (result, shared) where shared is True for
+        waiters; exceptions raised by the leader are re-raised in every waiter.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on a single event loop."""
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Awaits func() unless a call for key is already running, in which case it
+        awaits that call. The work runs as its own task, so a caller that
+        disconnects does not cancel it for the others.
+        """
+        task = self._tasks.get(key)
+        shared = task is not None
+        if not shared:
+            task = self._tasks[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return await asyncio.shield(task), shared
@@ -0,0 +1,114 @@
+"""
+Speculative recommendation generation
+
+Once the penultimate answer is in, the financial profile is known and only the
+final choice is missing. The chatbot starts recommendations in the background
+for the likeliest final answers. If the real answer matches one of them, the
+request claims that (possibly already finished) call. Otherwise the
+speculations are cancelled, or their results are discarded when they finish.
+Likelihood is learned from the final answers seen so far.
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from . import metrics
+
+for _name, _type, _help in (
+    ('speculation_started_total', 'counter', 'Speculative recommendation calls started'),
+    ('speculation_skipped_total', 'counter', 'Speculations not started, by reason'),
+    ('speculation_claims_total', 'counter', 'Final answers for speculated conversations, by outcome (hit or miss)'),
+    ('speculation_discarded_total', 'counter', 'Speculative calls whose result was never used (the cost of speculating)'),
+    ('speculation_head_start_seconds', 'histogram', 'How long a claimed speculation had been running when the final answer arrived'),
+):
+    metrics.REGISTRY.describe(_name, _type, _help)
+
+
+class Speculator:
+    """Runs speculative calls on a small thread pool, keyed per conversation."""
+
+    def __init__(self, width: int = 1, workers: int = 4, ttl: float = 300.0,
+                 has_headroom: Callable[[], bool] = lambda: True):
+        self.width = width
+        self.ttl = ttl
+        self.has_headroom = has_headroom
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='speculate')
+        self._lock = threading.Lock()
+        # conversation -> {result key: (future, started)}
+        self._pending: Dict[Hashable, Dict[Hashable, Tuple[Future, float]]] = {}
+        self._choices = Counter()
+
+    @classmethod
+    def from_env(cls, has_headroom: Callable[[], bool]) -> Optional['Speculator']:
+        """A Speculator when SPECULATIVE_RECOMMENDATIONS=1 (sized by SPECULATION_WIDTH/WORKERS/TTL), else None."""
+        if os.environ.get('SPECULATIVE_RECOMMENDATIONS') != '1':
+            return None
+        return cls(width=int(os.environ.get('SPECULATION_WIDTH', 1)),
+                   workers=int(os.environ.get('SPECULATION_WORKERS', 4)),
+                   ttl=float(os.environ.get('SPECULATION_TTL', 300)),
+                   has_headroom=has_headroom)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._pending.values())
+
+    def predict(self, options: List[str]) -> List[str]:
+        """The `width` most frequently chosen options so far; unseen options keep their listed order."""
+        ranked = sorted(options, key=lambda option: -self._choices[option])
+        return ranked[:self.width]
+
+    def record_choice(self, choice: str):
+        with self._lock:
+            self._choices[choice] += 1
+
+    def start(self, conversation: Hashable, key: Hashable, func: Callable[[], Dict]) -> bool:
+        """Starts func() in the background under key unless the model has no spare capacity."""
+        if not self.has_headroom():
+            metrics.inc('speculation_skipped_total', reason='no_headroom')
+            return False
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            entries = self._pending.setdefault(conversation, {})
+            if key in entries:
+                return False
+            entries[key] = (self._executor.submit(func), now)
+        metrics.inc('speculation_started_total')
+        return True
+
+    def claim(self, conversation: Hashable, key: Hashable) -> Optional[Future]:
+        """
+        The speculative call for key, if one was started, and drops the
+        conversation's other speculations. None when nothing was speculated or
+        the final answer didn't match.
+        """
+        with self._lock:
+            entries = self._pending.pop(conversation, None)
+        if not entries:
+            return None
+        claimed = entries.pop(key, None)
+        for future, _ in entries.values():
+            self._discard(future)
+        if claimed is None:
+            metrics.inc('speculation_claims_total', outcome='miss')
+            return None
+        future, started = claimed
+        metrics.inc('speculation_claims_total', outcome='hit')
+        metrics.observe('speculation_head_start_seconds', time.monotonic() - started)
+        return future
+
+    def _evict_expired(self, now: float):
+        """Drops speculations for conversations abandoned before their final answer."""
+        for conversation in [c for c, entries in self._pending.items()
+                             if all(now - started > self.ttl for _, started in entries.values())]:
+            for future, _ in self._pending.pop(conversation).values():
+                self._discard(future)
+
+    @staticmethod
+    def _discard(future: Future):
+        # Not-yet-started calls are cancelled; running ones finish and are dropped
+        future.cancel()
+        metrics.inc('speculation_discarded_total')
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Optional SQLite storage backend for the vehicle and lender tables
+
+The CSVs are imported once into an indexed database: vehicles by price, year
+and body type, and lender products by credit tier and term, with regional
+coverage in its own table. SQLiteVehicleIndex and SQLiteLenderIndex answer the
+same queries as VehiclePriceIndex and LenderIndex, so the quote, affordability
+and catalog code runs unchanged against either backend without holding the
+tables in memory. Reads borrow a connection from a small pool
+(SQLITE_POOL_SIZE, default 4) and give it back when the query is done, so a
+threaded server holds at most that many connections however many request
+threads it spawns.
+
+    python -m src.sqlite_store data/toyota.db
+    DATA_BACKEND=sqlite SQLITE_DB_PATH=data/toyota.db python run.py
+"""
+
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .data_loading import iter_financing_data, iter_vehicles_from_csv
+from .quote_engine import DEFAULT_RATE, RATE_COLUMNS, LenderProduct, lender_coverage, parse_rate_range, parse_terms, tier_name
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vehicles (
+    id INTEGER PRIMARY KEY,
+    year INTEGER NOT NULL,
+    make TEXT,
+    model TEXT,
+    trim TEXT,
+    price INTEGER NOT NULL,
+    body_type TEXT,
+    mpg_estimate TEXT,
+    estimated_residual_36mo_percent TEXT
+);
+CREATE INDEX IF NOT EXISTS vehicles_price ON vehicles (price, id);
+CREATE INDEX IF NOT EXISTS vehicles_year ON vehicles (year, price);
+CREATE INDEX IF NOT EXISTS vehicles_body_type ON vehicles (body_type COLLATE NOCASE, price);
+
+CREATE TABLE IF NOT EXISTS lenders (
+    id INTEGER PRIMARY KEY,
+    row_json TEXT NOT NULL
+);
+
+-- One row per lender x credit tier x term; lender_id keeps file order
+CREATE TABLE IF NOT EXISTS lender_products (
+    lender_id INTEGER NOT NULL,
+    tier TEXT NOT NULL,
+    term INTEGER NOT NULL,
+    term_position INTEGER NOT NULL,
+    lender_name TEXT NOT NULL,
+    rate_min REAL NOT NULL,
+    rate_max REAL NOT NULL,
+    loan_types TEXT NOT NULL,
+    nationwide INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lender_products_tier_term ON lender_products (tier, term);
+CREATE INDEX IF NOT EXISTS lender_products_tier_order ON lender_products (tier, lender_id, term_position);
+
+CREATE TABLE IF NOT EXISTS lender_states (
+    state TEXT NOT NULL,
+    lender_id INTEGER NOT NULL,
+    PRIMARY KEY (state, lender_id)
+) WITHOUT ROWID;
+"""
+
+VEHICLE_COLUMNS = ('year', 'make', 'model', 'trim', 'price', 'body_type', 'mpg_estimate',
+                   'estimated_residual_36mo_percent')
+TABLES = ('vehicles', 'lenders', 'lender_products', 'lender_states')
+# Stored as PRAGMA user_version; databases imported with an older schema are re-imported
+SCHEMA_VERSION = 3
+SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', 4))
+# Loan type lists are stored joined by this separator
+_LOAN_TYPE_SEPARATOR = '\x1f'
+
+
+class SQLiteStore:
+    """A vehicle/lender database read through a bounded pool of connections."""
+
+    def __init__(self, db_path: str, pool_size: int = SQLITE_POOL_SIZE):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self._idle: 'queue.LifoQueue[sqlite3.Connection]' = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        A read connection for the duration of the block, opened while fewer than
+        pool_size exist; otherwise waits for one to be given back.
+        """
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.pool_size
+                if can_open:
+                    self._opened += 1
+            conn = self._open() if can_open else self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def _open(self) -> sqlite3.Connection:
+        try:
+            # Pooled connections move between request threads, one at a time
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA query_only = ON')
+        except sqlite3.Error:
+            with self._lock:
+                self._opened -= 1
+            raise
+        return conn
+
+    def close(self):
+        """Closes the idle connections."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+    def needs_import(self) -> bool:
+        """True when the database is missing, empty or was imported with an older schema."""
+        if not os.path.exists(self.db_path):
+            return True
+        try:
+            with self.connection() as conn:
+                if conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+                    return True
+                return conn.execute('SELECT COUNT(*) FROM vehicles').fetchone()[0] == 0
+        except sqlite3.OperationalError:
+            return True
+
+    # --- Import ---
+
+    def import_data(self, vehicles: Iterable[Dict], lenders: Iterable[Dict]) -> Dict[str, int]:
+        """Replaces both tables in one transaction, streaming rows so inputs can exceed memory."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('PRAGMA journal_mode = WAL')
+            # Tables are dropped rather than emptied so an older schema is replaced too; the
+            # transaction opened here spans the recreate and the inserts below
+            conn.executescript('BEGIN;\n' + ''.join(f'DROP TABLE IF EXISTS {table};\n' for table in TABLES) + SCHEMA)
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO vehicles ({', '.join(VEHICLE_COLUMNS)}) VALUES ({', '.join('?' * len(VEHICLE_COLUMNS))})",
+                    (tuple(vehicle.get(column) for column in VEHICLE_COLUMNS) for vehicle in vehicles))
+                lender_count = 0
+                for lender_id, lender in enumerate(lenders, start=1):
+                    lender_count += 1
+                    self._insert_lender(conn, lender_id, lender)
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.execute('ANALYZE')
+            vehicle_count = conn.execute('SELECT COUNT(*) FROM vehicles').fetchone()[0]
+        finally:
+            conn.close()
+        return {'vehicles': vehicle_count, 'lenders': lender_count}
+
+    @staticmethod
+    def _insert_lender(conn: sqlite3.Connection, lender_id: int, lender: Dict):
+        conn.execute('INSERT INTO lenders (id, row_json) VALUES (?, ?)', (lender_id, json.dumps(lender)))
+        # Same parsing and filtering as LenderIndex
+        covers_us, states = lender_coverage(lender)
+        if not covers_us:
+            return
+        lender_name = lender.get('lender_name', 'Unknown Lender').strip()
+        terms_months = parse_terms(lender.get('typical_terms_months'))
+        loan_types = [t.strip() for t in lender.get('loan_types_offered', '').split(',') if t.strip()]
+        for column in RATE_COLUMNS:
+            rate_range = parse_rate_range(lender.get(column))
+            if rate_range['min'] >= DEFAULT_RATE:
+                continue
+            conn.executemany(
+                'INSERT INTO lender_products VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(lender_id, tier_name(column), term, position, lender_name, rate_range['min'], rate_range['max'],
+                  _LOAN_TYPE_SEPARATOR.join(loan_types), states is None)
+                 for position, term in enumerate(terms_months)])
+        if states is not None:
+            conn.executemany('INSERT INTO lender_states VALUES (?, ?)', [(state, lender_id) for state in sorted(states)])
+
+    # --- Reads ---
+
+    def catalog(self, limit: Optional[int] = None) -> List[Dict]:
+        """Vehicles in import (file) order, optionally only the first limit."""
+        with self.connection() as conn:
+            rows = conn.execute(f"SELECT {', '.join(VEHICLE_COLUMNS)} FROM vehicles ORDER BY id LIMIT ?",
+                                (-1 if limit is None else limit,))
+            return [dict(row) for row in rows]
+
+    def lenders(self) -> List[Dict]:
+        """Lender rows as loaded from the CSV."""
+        with self.connection() as conn:
+            return [json.loads(row[0]) for row in conn.execute('SELECT row_json FROM lenders ORDER BY id')]
+
+    def vehicle_index(self) -> 'SQLiteVehicleIndex':
+        return SQLiteVehicleIndex(self)
+
+    def lender_index(self) -> 'SQLiteLenderIndex':
+        return SQLiteLenderIndex(self)
+
+
+class SQLiteVehicleIndex:
+    """VehiclePriceIndex over the vehicles table: price range queries use the price index."""
+
+    _SELECT = f"SELECT {', '.join(VEHICLE_COLUMNS)} FROM vehicles"
+
+    def __init__(self, store: SQLiteStore):
+        self.store = store
+        with store.connection() as conn:
+            self._count = conn.execute('SELECT COUNT(*) FROM vehicles').fetchone()[0]
+
+    def __len__(self):
+        return self._count
+
+    def count_up_to(self, max_price) -> int:
+        """Number of vehicles priced at or below max_price."""
+        with self.store.connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM vehicles WHERE price <= ?', (max_price,)).fetchone()[0]
+
+    def up_to(self, max_price, limit: Optional[int] = None) -> List[Dict]:
+        """Cheapest-first vehicles priced at or below max_price, optionally capped at limit."""
+        with self.store.connection() as conn:
+            rows = conn.execute(f"{self._SELECT} WHERE price <= ? ORDER BY price, id LIMIT ?",
+                                (max_price, -1 if limit is None else limit))
+            return [dict(row) for row in rows]
+
+    def find(self, year=None, body_type=None, max_price=None, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """Cheapest-first vehicles matching every given filter, paged by limit/offset."""
+        clauses, params = [], []
+        if year is not None:
+            clauses.append('year = ?')
+            params.append(year)
+        if body_type is not None:
+            clauses.append('body_type = ? COLLATE NOCASE')
+            params.append(body_type)
+        if max_price is not None:
+            clauses.append('price <= ?')
+            params.append(max_price)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        with self.store.connection() as conn:
+            rows = conn.execute(f"{self._SELECT}{where} ORDER BY price, id LIMIT ? OFFSET ?",
+                                (*params, -1 if limit is None else limit, offset))
+            return [dict(row) for row in rows]
+
+
+class SQLiteLenderIndex:
+    """LenderIndex over the lender_products table, looked up by tier (and state)."""
+
+    def __init__(self, store: SQLiteStore):
+        self.store = store
+        with store.connection() as conn:
+            self.lender_count = conn.execute('SELECT COUNT(*) FROM lenders').fetchone()[0]
+
+    def products(self, rate_column, state: Optional[str] = None, nationwide_only: bool = False,
+                 any_region: bool = False) -> List[LenderProduct]:
+        """
+        (lender_name, rate_min, rate_max, terms_months, loan_types) for every lender
+        that publishes a rate for the tier column and covers the state (every US
+        state when there is none, or with nationwide_only), in file order.
+        any_region returns every US lender instead.
+        """
+        query = ('SELECT lender_id, lender_name, rate_min, rate_max, loan_types, term FROM lender_products '
+                 'WHERE tier = ?')
+        params = [tier_name(rate_column)]
+        if nationwide_only or (state is None and not any_region):
+            query += ' AND nationwide = 1'
+        elif state is not None and not any_region:
+            query += ' AND (nationwide = 1 OR lender_id IN (SELECT lender_id FROM lender_states WHERE state = ?))'
+            params.append(state)
+        query += ' ORDER BY lender_id, term_position'
+
+        with self.store.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+        products = []
+        current_id = None
+        for lender_id, lender_name, rate_min, rate_max, loan_types, term in rows:
+            if lender_id != current_id:
+                current_id = lender_id
+                products.append((lender_name, rate_min, rate_max, [], loan_types.split(_LOAN_TYPE_SEPARATOR)))
+            products[-1][3].append(term)
+        return products
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import the vehicle and lender CSVs into a SQLite database')
+    parser.add_argument('db', help='database file to create or replace')
+    data_dir = os.path.join(os.path.dirname(__file__), '..', 'data')
+    parser.add_argument('--vehicles', default=os.path.join(data_dir, 'toyotacars.csv'), help='vehicle CSV (default: the app data file)')
+    parser.add_argument('--lenders', default=os.path.join(data_dir, 'financeandlease.csv'), help='lender CSV (default: the app data file)')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    counts = SQLiteStore(args.db).import_data(iter_vehicles_from_csv(args.vehicles), iter_financing_data(args.lenders))
+    print(f"Imported {counts['vehicles']} vehicles and {counts['lenders']} lenders into {args.db} "
+          f"in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
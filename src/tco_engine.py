@@ -0,0 +1,206 @@
+"""
+Total cost of ownership for the whole catalog
+
+For every vehicle x loan term x credit tier x horizon (3, 5 and 7 years) the
+engine computes, as NumPy arrays:
+
+- financing: the down payment, the loan payments made within the horizon, the
+  payoff of any balance still owed, plus fuel, minus the resale value at the
+  horizon;
+- leasing: the lease payments for the whole horizon (renewing at the same
+  rate), plus fuel.
+
+Payments use the best rate per tier and term with the same formulas as the
+quote engine, from nationwide lenders only unless the table is built for a
+state, in which case that state's regional lenders compete too. Fuel comes
+from the vehicle's mpg_estimate and the TCO_ANNUAL_MILES / TCO_FUEL_PRICE
+assumptions. Resale value decays geometrically from
+estimated_residual_36mo_percent (that share of the price left every 36
+months). Vehicles with no usable mpg or residual get NaN costs and are left
+out of rankings.
+
+The arrays cover the vehicles they are built from, which is the loaded catalog.
+Under DATA_BACKEND=sqlite that is the first CATALOG_LIMIT vehicles; the arrays
+hold 40 floats per vehicle per array, so they are not built for a whole store.
+"""
+
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import metrics
+from .quote_engine import LEASE_MONTHLY_FACTOR, RATE_COLUMNS, LenderIndex, major_loan_type, tier_name
+
+HORIZON_MONTHS = (36, 60, 84)
+OPTION_TYPES = ('financing', 'lease')
+TCO_ANNUAL_MILES = float(os.environ.get('TCO_ANNUAL_MILES', 12000))
+TCO_FUEL_PRICE = float(os.environ.get('TCO_FUEL_PRICE', 3.50))
+# Share of the price paid up front on financed purchases, as in the payment badges
+DOWN_PAYMENT_RATE = 0.1
+
+# The first number of an mpg estimate; '38/94 (Combined/MPGe)' reads as 38 mpg
+_MPG = re.compile(r'\d+(?:\.\d+)?')
+
+
+def parse_mpg(value) -> float:
+    match = _MPG.search(str(value or ''))
+    mpg = float(match.group()) if match else 0.0
+    return mpg if mpg > 0 else np.nan
+
+def parse_percent(value) -> float:
+    try:
+        percent = float(value)
+    except (TypeError, ValueError):
+        return np.nan
+    return percent / 100 if 0 < percent <= 100 else np.nan
+
+
+class TCOTable:
+    """
+    Catalog-wide total cost arrays indexed [vehicle, term, tier, horizon], with
+    the rankings derived from them cached per query.
+    """
+
+    def __init__(self, vehicles: List[Dict], lender_index: LenderIndex, state: Optional[str] = None,
+                 annual_miles: float = TCO_ANNUAL_MILES, fuel_price: float = TCO_FUEL_PRICE,
+                 down_payment_rate: float = DOWN_PAYMENT_RATE, horizons: Tuple[int, ...] = HORIZON_MONTHS):
+        self.vehicles = vehicles
+        self.state = state
+        self.tiers = tuple(tier_name(rate_column) for rate_column in RATE_COLUMNS)
+        self.horizons = tuple(horizons)
+        self.annual_miles = annual_miles
+        self.fuel_price = fuel_price
+        self._rankings: Dict[Tuple, Tuple[np.ndarray, ...]] = {}
+
+        self.terms, rates, self._banks = self._best_rates(lender_index, state)
+        terms = np.array(self.terms, dtype=float)
+        months = np.array(self.horizons, dtype=float)
+
+        price = np.array([vehicle['price'] for vehicle in vehicles], dtype=float)
+        mpg = np.array([parse_mpg(vehicle.get('mpg_estimate')) for vehicle in vehicles], dtype=float)
+        residual = np.array([parse_percent(vehicle.get('estimated_residual_36mo_percent')) for vehicle in vehicles],
+                            dtype=float)
+        down_payment = price * down_payment_rate
+        principal = price - down_payment
+
+        # [vehicle, horizon]
+        self.fuel_cost = (months / 12 * annual_miles * fuel_price)[None, :] / mpg[:, None]
+        self.resale_value = price[:, None] * residual[:, None] ** (months / 36)[None, :]
+
+        # Financing: annuity payment per [term, tier] and the share of principal still owed at each horizon
+        monthly_rate = rates['financing'] / 100 / 12
+        growth = (1 + monthly_rate) ** terms[:, None]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            factor = np.where(monthly_rate > 0, monthly_rate * growth / (growth - 1),
+                              np.where(monthly_rate == 0, 1 / terms[:, None], np.nan))
+            owed = np.where(monthly_rate[..., None] > 0,
+                            (growth[..., None] - (1 + monthly_rate[..., None]) ** months) / (growth[..., None] - 1),
+                            (terms[:, None, None] - months) / terms[:, None, None])
+        owed = np.clip(owed, 0, None)
+        months_paid = np.minimum(terms[:, None], months[None, :])
+
+        # [vehicle, term, tier] and [vehicle, term, tier, horizon]
+        self.financing_payment = principal[:, None, None] * factor[None]
+        self.financing_payoff = principal[:, None, None, None] * owed[None]
+        self.financing_tco = (down_payment[:, None, None, None]
+                              + self.financing_payment[..., None] * months_paid[None, :, None, :]
+                              + self.financing_payoff
+                              - self.resale_value[:, None, None, :]
+                              + self.fuel_cost[:, None, None, :])
+
+        self.lease_payment = price[:, None, None] * LEASE_MONTHLY_FACTOR * (1 + rates['lease'] / 100 / 12)[None]
+        self.lease_tco = self.lease_payment[..., None] * months + self.fuel_cost[:, None, None, :]
+
+    @staticmethod
+    def _best_rates(lender_index: LenderIndex,
+                    state: Optional[str]) -> Tuple[Tuple[int, ...], Dict[str, np.ndarray], Dict[str, List]]:
+        """
+        Every offered term, the lowest rate per [term, tier] for each option type
+        (NaN if none) and its lender; nationwide lenders only without a state.
+        """
+        best: Dict[Tuple[str, int, int], Tuple[float, str, str]] = {}
+        for tier, rate_column in enumerate(RATE_COLUMNS):
+            for lender_name, rate_min, _, terms_months, loan_types in lender_index.products(rate_column, state, nationwide_only=state is None):
+                for major_type in {major_loan_type(loan_type) for loan_type in loan_types} - {None}:
+                    for term in terms_months:
+                        # Ties go to the lender whose option key sorts first, as in BestOfferTable
+                        candidate = (rate_min, lender_name.lower(), lender_name)
+                        key = (major_type, term, tier)
+                        if key not in best or candidate < best[key]:
+                            best[key] = candidate
+
+        terms = tuple(sorted({term for _, term, _ in best}))
+        rates = {major_type: np.full((len(terms), len(RATE_COLUMNS)), np.nan) for major_type in OPTION_TYPES}
+        banks = {major_type: [[None] * len(RATE_COLUMNS) for _ in terms] for major_type in OPTION_TYPES}
+        for (major_type, term, tier), (rate_min, _, lender_name) in best.items():
+            rates[major_type][terms.index(term), tier] = rate_min
+            banks[major_type][terms.index(term)][tier] = lender_name
+        return terms, rates, banks
+
+    def __len__(self) -> int:
+        return len(self.vehicles)
+
+    def ranking(self, tier: str, horizon: int, option_type: Optional[str] = None,
+                term: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (order, cost, type index, term index): vehicles cheapest first by their
+        lowest TCO over the allowed option types and terms, leaving out vehicles
+        with no cost. cost and the indices are per vehicle, in catalog order.
+        """
+        cache_key = (tier, horizon, option_type, term)
+        ranking = self._rankings.get(cache_key)
+        metrics.record_cache('tco_rankings', ranking is not None)
+        if ranking is not None:
+            return ranking
+
+        tier_index, horizon_index = self.tiers.index(tier), self.horizons.index(horizon)
+        type_indices = [OPTION_TYPES.index(option_type)] if option_type else list(range(len(OPTION_TYPES)))
+        term_indices = [self.terms.index(term)] if term is not None else list(range(len(self.terms)))
+
+        # [vehicle, type, term] flattened to one candidate axis per vehicle
+        candidates = np.stack([self.financing_tco[:, :, tier_index, horizon_index],
+                               self.lease_tco[:, :, tier_index, horizon_index]], axis=1)
+        candidates = candidates[:, type_indices][:, :, term_indices].reshape(len(self.vehicles),
+                                                                             len(type_indices) * len(term_indices))
+        candidates = np.where(np.isnan(candidates), np.inf, candidates)
+        if candidates.shape[1] == 0:
+            # No lender offers any term
+            candidates = np.full((len(self.vehicles), 1), np.inf)
+        best = np.argmin(candidates, axis=1)
+        cost = candidates[np.arange(len(self.vehicles)), best]
+
+        order = np.argsort(cost, kind='stable')
+        order = order[np.isfinite(cost[order])]
+        types = np.array(type_indices)[best // max(len(term_indices), 1)]
+        terms = np.array(term_indices, dtype=int)[best % len(term_indices)] if term_indices else best
+        ranking = (order, cost, types, terms)
+        self._rankings[cache_key] = ranking
+        return ranking
+
+    def ranked(self, tier: str, horizon: int, option_type: Optional[str] = None, term: Optional[int] = None,
+               limit: int = 20, offset: int = 0) -> Tuple[List[Dict], int]:
+        """One page of the ranking with each vehicle's cost breakdown, and the number of ranked vehicles."""
+        order, cost, types, terms = self.ranking(tier, horizon, option_type, term)
+        tier_index, horizon_index = self.tiers.index(tier), self.horizons.index(horizon)
+        page = []
+        for rank, vehicle_index in enumerate(order[offset:offset + limit], start=offset + 1):
+            major_type = OPTION_TYPES[types[vehicle_index]]
+            term_index = terms[vehicle_index]
+            cell = (vehicle_index, term_index, tier_index)
+            financing = major_type == 'financing'
+            payment = self.financing_payment[cell] if financing else self.lease_payment[cell]
+            page.append({
+                'rank': rank,
+                'vehicle': self.vehicles[vehicle_index],
+                'type': major_type,
+                'term': self.terms[term_index],
+                'bank': self._banks[major_type][term_index][tier_index],
+                'monthly_payment': round(float(payment), 2),
+                'fuel_cost': round(float(self.fuel_cost[vehicle_index, horizon_index]), 2),
+                'resale_value': round(float(self.resale_value[vehicle_index, horizon_index]), 2) if financing else None,
+                'loan_payoff': round(float(self.financing_payoff[cell + (horizon_index,)]), 2) if financing else None,
+                'total_cost': round(float(cost[vehicle_index]), 2),
+            })
+        return page, len(order)